@@ -1,14 +1,16 @@
 import os
 import logging
-from flask import Flask, jsonify
-from flask_cors import CORS
+from flask import Flask, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from flask_restful import Api
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_talisman import Talisman
 from flask_compress import Compress
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
+import config
 
 # Cargar variables de entorno ANTES de importar extensiones
 # Esto es crítico para que extensiones.py pueda leer las variables
@@ -16,20 +18,33 @@ env_file = '.env.production' if os.environ.get('FLASK_ENV') == 'production' else
 load_dotenv(env_file)
 
 # Importar extensiones y recursos
-from extensions import db, jwt, swagger, migrate
-from scripts.sync_supabase import sync_supabase_command
-from resources import init_resources
+from extensions import db, jwt, swagger, migrate, redis_client  # noqa: E402
+from scripts.sync_supabase import sync_supabase_command  # noqa: E402
+from resources import init_resources  # noqa: E402
+from common import JWT_BLOCKLIST_ENABLED, dumps_json  # noqa: E402
 
 # Configuración de Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Ningún formato usa hilo ni archivo/línea: no calcularlos en cada registro
+# (logProcesses se mantiene: el formato de gunicorn usa %(process)d)
+logging.logThreads = False
+logging.logMultiprocessing = False
+logging._srcfile = None
+
+# En producción el runtime del contenedor ya añade la marca de tiempo a cada línea
+if os.environ.get('FLASK_ENV') == 'production':
+    LOG_FORMAT = '%(levelname)s %(name)s %(message)s'
+else:
+    LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+
 logger = logging.getLogger(__name__)
 
 # Verificar entorno
 FLASK_ENV = os.environ.get('FLASK_ENV', 'development')
 IS_PRODUCTION = FLASK_ENV == 'production'
+IS_TESTING = FLASK_ENV == 'testing'
+FLASK_DEBUG = os.environ.get('FLASK_DEBUG') == '1'
 logger.info(f"🔧 Entorno: {FLASK_ENV}")
 logger.info(f"🚀 Modo producción: {IS_PRODUCTION}")
 
@@ -42,10 +57,25 @@ jwt_secret = os.environ.get('JWT_SECRET_KEY')
 if not jwt_secret or len(jwt_secret) < 32:
     raise RuntimeError("JWT_SECRET_KEY es obligatoria y debe tener al menos 32 caracteres")
 
-if IS_PRODUCTION and os.environ.get('FLASK_DEBUG') == '1':
+if IS_PRODUCTION and FLASK_DEBUG:
     raise RuntimeError("No se permite ejecutar en modo DEBUG (FLASK_DEBUG=1) en producción (SEG-07)")
 
+class ORJSONProvider(DefaultJSONProvider):
+    """Proveedor JSON de Flask respaldado por orjson (usado por jsonify)."""
+
+    def dumps(self, obj, **kwargs):
+        return dumps_json(obj).decode('utf-8')
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
+
+# Detrás del proxy del despliegue remote_addr es siempre la IP del proxy: los límites
+# por IP (p. ej. /auth) serían uno solo para todos los clientes. ProxyFix toma la IP del
+# cliente de X-Forwarded-For, confiando solo en los últimos PROXY_FIX_X_FOR saltos
+# (0 = sin proxy delante; un valor mayor que los proxies reales permite falsificar la IP)
+PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 1 if IS_PRODUCTION else 0))
+if PROXY_FIX_X_FOR > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_FIX_X_FOR)
 
 # Configuración de CORS (SEG-06)
 raw_origins = os.environ.get('ALLOWED_ORIGINS', '')
@@ -55,30 +85,58 @@ if IS_PRODUCTION:
     if not origins:
         raise RuntimeError("ALLOWED_ORIGINS es obligatoria en producción (CORS cerrado)")
     logger.info(f"CORS configurado para orígenes: {origins}")
-    CORS(app, resources={r"/*": {"origins": origins}})
 else:
     # Para desarrollo permitimos localhost por defecto si no se especifican orígenes
     if not origins:
         origins = ["http://localhost:5173"]
     logger.info(f"CORS configurado para desarrollo, permitiendo orígenes: {origins}")
-    CORS(app, resources={r"/*": {"origins": origins}})
+
+# Lista fija de orígenes: basta una búsqueda en frozenset por respuesta, sin el
+# emparejamiento de rutas/patrones que Flask-CORS hace en cada request.
+ALLOWED_ORIGINS = frozenset(origins)
+CORS_ALLOW_METHODS = 'GET, HEAD, POST, OPTIONS, PUT, PATCH, DELETE'
+
+@app.after_request
+def aplicar_cors(response):
+    origin = request.headers.get('Origin')
+    if origin in ALLOWED_ORIGINS:
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.vary.add('Origin')
+        # Preflight: Flask responde OPTIONS automáticamente, aquí solo se añaden cabeceras
+        if request.method == 'OPTIONS' and 'Access-Control-Request-Method' in request.headers:
+            response.headers['Access-Control-Allow-Methods'] = CORS_ALLOW_METHODS
+            request_headers = request.headers.get('Access-Control-Request-Headers')
+            if request_headers:
+                response.headers['Access-Control-Allow-Headers'] = request_headers
+    return response
 
 # Configuración de la base de datos
 app.config['SQLALCHEMY_DATABASE_URI'] = db_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+DATABASE_TYPE = "sqlite" if "sqlite" in db_url else "postgresql"
+
 # Configurar options del engine de forma condicional (evitar pooling en SQLite de pruebas)
-if "sqlite" in app.config['SQLALCHEMY_DATABASE_URI']:
+if DATABASE_TYPE == "sqlite":
     app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
         'pool_pre_ping': True
     }
 else:
     app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
         'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
         'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 300)),
         'pool_pre_ping': True,
+        # LIFO: reutilizar la conexión más reciente (ya caliente) y dejar que las
+        # ociosas expiren por pool_recycle en lugar de rotarlas todas
+        'pool_use_lifo': True,
     }
+    # Cortar consultas colgadas en el servidor (0 = sin límite)
+    statement_timeout_ms = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+    if statement_timeout_ms:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS']['connect_args'] = {
+            'options': f'-c statement_timeout={statement_timeout_ms}'
+        }
 
 # Configuración S3
 app.config['S3_BUCKET'] = os.environ.get('S3_BUCKET')
@@ -92,20 +150,23 @@ if not app.config['S3_BUCKET'] or not app.config['S3_REGION']:
 
 # Configuración de Archivos
 app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 50 * 1024 * 1024))
-app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'pdf'}
+app.config['ALLOWED_EXTENSIONS'] = config.ALLOWED_EXTENSIONS
 
 # Configuración JWT
 jwt_expires_str = os.environ.get('JWT_EXPIRES_SECONDS', '43200')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = int(jwt_expires_str.split('#')[0].strip())
 app.config['JWT_ALGORITHM'] = 'HS256'
 app.config['JWT_SECRET_KEY'] = jwt_secret
-app.config['JWT_BLACKLIST_ENABLED'] = False
 app.config['PROPAGATE_EXCEPTIONS'] = True
 
 # Configuración Limiter
-app.config['RATELIMIT_STORAGE_URL'] = os.environ.get('LIMITER_STORAGE_URI', 'memory://')
-app.config['RATELIMIT_STRATEGY'] = 'fixed-window'
-if os.environ.get('FLASK_ENV') == 'testing':
+# Redis comparte los contadores entre workers de gunicorn; la estrategia
+# moving-window se ejecuta en Redis como script Lua atómico (sorted set).
+app.config['RATELIMIT_STORAGE_URI'] = (
+    os.environ.get('LIMITER_STORAGE_URI') or os.environ.get('REDIS_URL') or 'memory://'
+)
+app.config['RATELIMIT_STRATEGY'] = 'moving-window'
+if IS_TESTING:
     app.config['RATELIMIT_ENABLED'] = False
 
 # Configuración Swagger
@@ -118,9 +179,37 @@ app.config['SWAGGER'] = {
 db.init_app(app)
 migrate.init_app(app, db)
 jwt.init_app(app)
+
+# Revocación de tokens (opcional, requiere REDIS_URL). Claves:
+#   jwt:blocklist:<jti>       -> token individual revocado (POST /auth/logout)
+#   jwt:revoked_user:<sub>    -> epoch desde el cual se revocan los tokens del usuario
+#                                (cambio de contraseña/rol/almacén o usuario eliminado)
+# Las escriben common.revocar_token y common.revocar_tokens_usuario. Ambas se consultan
+# con un solo MGET: una ida y vuelta a Redis por request.
+if JWT_BLOCKLIST_ENABLED:
+    @jwt.token_in_blocklist_loader
+    def token_revocado(jwt_header, jwt_payload):
+        jti_revocado, revocado_desde = redis_client.mget(
+            f"jwt:blocklist:{jwt_payload['jti']}",
+            f"jwt:revoked_user:{jwt_payload['sub']}"
+        )
+        if jti_revocado is not None:
+            return True
+        return revocado_desde is not None and jwt_payload['iat'] <= float(revocado_desde)
+
+    @jwt.revoked_token_loader
+    def revoked_token_callback(jwt_header, jwt_payload):
+        return jsonify({'message': 'El token ha sido revocado', 'error': 'token_revoked'}), 401
 Compress(app)  # Compresión gzip automática para respuestas
 api = Api(app)
 
+@api.representation('application/json')
+def output_json(data, code, headers=None):
+    """Serializa las respuestas de Flask-RESTful con orjson."""
+    resp = app.response_class(dumps_json(data, indent=app.debug), status=code, mimetype='application/json')
+    resp.headers.extend(headers or {})
+    return resp
+
 # Inicializar Limiter
 def get_key_func():
     try:
@@ -132,14 +221,16 @@ def get_key_func():
         pass
     return get_remote_address()
 
+DEFAULT_RATE_LIMIT = os.environ.get('DEFAULT_RATE_LIMIT', '200 per day;50 per hour')
+
 limiter = Limiter(
     key_func=get_key_func,
     app=app,
-    default_limits=[os.environ.get('DEFAULT_RATE_LIMIT', '200 per day;50 per hour')],
+    default_limits=[DEFAULT_RATE_LIMIT],
 )
 
 # Verificar storage limiter
-storage_url = app.config.get('RATELIMIT_STORAGE_URL', '')
+storage_url = app.config.get('RATELIMIT_STORAGE_URI', '')
 if 'memory' in storage_url and IS_PRODUCTION:
     logger.warning("Flask-Limiter usando memoria en producción. Considere Redis.")
 
@@ -162,18 +253,32 @@ talisman = Talisman(
 # CLI Commands
 app.cli.add_command(sync_supabase_command)
 
+# Cuerpos JSON constantes de las respuestas de error y health check, serializados
+# una sola vez. Se crea un Response nuevo por petición (no se comparte la instancia)
+# porque CORS, Talisman y Compress modifican las cabeceras de cada respuesta.
+_BODY_401_AUTH = dumps_json({'message': 'Se requiere autenticación', 'error': 'authorization_required'})
+_BODY_401_EXPIRED = dumps_json({'message': 'El token ha expirado', 'error': 'token_expired'})
+_BODY_401_INVALID = dumps_json({'message': 'Verificación de firma fallida', 'error': 'invalid_token'})
+_BODY_404 = dumps_json({"error": "Recurso no encontrado"})
+_BODY_405 = dumps_json({"error": "Método no permitido"})
+_BODY_HEALTH_OK = dumps_json({"status": "ok", "database": "connected"})
+_BODY_HEALTH_FAIL = dumps_json({"status": "unhealthy", "database": "disconnected"})
+
+def _json_estatico(body, status):
+    return app.response_class(body, status=status, mimetype='application/json')
+
 # JWT Error Handling
 @jwt.unauthorized_loader
 def unauthorized_callback(callback):
-    return jsonify({'message': 'Se requiere autenticación', 'error': 'authorization_required'}), 401
+    return _json_estatico(_BODY_401_AUTH, 401)
 
 @jwt.expired_token_loader
 def expired_token_callback(jwt_header, jwt_payload):
-    return jsonify({'message': 'El token ha expirado', 'error': 'token_expired'}), 401
+    return _json_estatico(_BODY_401_EXPIRED, 401)
 
 @jwt.invalid_token_loader
 def invalid_token_callback(error):
-    return jsonify({'message': 'Verificación de firma fallida', 'error': 'invalid_token'}), 401
+    return _json_estatico(_BODY_401_INVALID, 401)
 
 # Error Handlers
 @app.errorhandler(500)
@@ -183,11 +288,11 @@ def handle_internal_server_error(e):
 
 @app.errorhandler(404)
 def handle_not_found_error(e):
-    return jsonify({"error": "Recurso no encontrado"}), 404
+    return _json_estatico(_BODY_404, 404)
 
 @app.errorhandler(405)
 def handle_method_not_allowed(e):
-    return jsonify({"error": "Método no permitido"}), 405
+    return _json_estatico(_BODY_405, 405)
 
 @app.errorhandler(413)
 def handle_request_entity_too_large(e):
@@ -202,10 +307,10 @@ def handle_request_entity_too_large(e):
 def health_check():
     try:
         db.session.execute(db.text('SELECT 1'))
-        return jsonify({"status": "ok", "database": "connected"}), 200
+        return _json_estatico(_BODY_HEALTH_OK, 200)
     except Exception as e:
         logger.error(f"Health check failed: {e}")
-        return jsonify({"status": "unhealthy", "database": "disconnected"}), 503
+        return _json_estatico(_BODY_HEALTH_FAIL, 503)
 
 # Config Info
 @app.route('/config')
@@ -216,8 +321,8 @@ def config_info():
     return jsonify({
         "flask_env": FLASK_ENV,
         "is_production": IS_PRODUCTION,
-        "database_type": "sqlite" if "sqlite" in app.config['SQLALCHEMY_DATABASE_URI'] else "postgresql",
-        "rate_limit": os.environ.get('DEFAULT_RATE_LIMIT')
+        "database_type": DATABASE_TYPE,
+        "rate_limit": DEFAULT_RATE_LIMIT
     }), 200
 
 # Registrar Recursos con Contexto
@@ -226,5 +331,8 @@ with app.app_context():
     swagger.init_app(app)
 
 if __name__ == '__main__':
+    # El servidor de desarrollo de Werkzeug no se usa en producción (ver gunicorn_conf.py)
+    if IS_PRODUCTION:
+        raise SystemExit("En producción use gunicorn: gunicorn -c gunicorn_conf.py app:app")
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_DEBUG') == '1')
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=FLASK_DEBUG)
@@ -1,17 +1,33 @@
 # common.py
+import base64
+import binascii
+import hashlib
 import logging
+import os
 import re
+import secrets
+import threading
+import time
+import uuid
+import orjson
+import redis
 import werkzeug.exceptions
 from decimal import Decimal
 from functools import wraps
 from datetime import datetime, date, timezone
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
-from flask import jsonify, request
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from cachetools import TTLCache
+from flask import g, has_request_context, request
 from flask_jwt_extended import verify_jwt_in_request, get_jwt
 from marshmallow import ValidationError
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import check_password_hash
 
-from extensions import db
+from extensions import db, redis_client
 from utils.date_utils import to_peru_time, get_peru_now
 import config
 
@@ -21,6 +37,19 @@ logger = logging.getLogger(__name__)
 # Re-exportar constante para compatibilidad
 MAX_ITEMS_PER_PAGE = config.MAX_ITEMS_PER_PAGE
 
+# Patrones precompilados para validate_password
+_LETRA_PATTERN = re.compile(r'[a-z]')
+_DIGITO_PATTERN = re.compile(r'[0-9]')
+
+# Hash de contraseñas: argon2id (extensión C) con los parámetros mínimos de OWASP.
+# Los hashes pbkdf2 de werkzeug existentes se siguen aceptando y se migran al hacer login.
+_password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
+# Verificaciones de contraseña exitosas recientes (ver verificar_password)
+_PASSWORD_CACHE_KEY = secrets.token_bytes(32)
+_password_cache = TTLCache(maxsize=1024, ttl=30)
+_password_cache_lock = threading.Lock()
+
 def parse_iso_datetime(date_string: str, add_timezone: bool = True) -> datetime:
     """
     Parsea una fecha ISO 8601 de manera robusta, manejando diferentes formatos.
@@ -41,31 +70,18 @@ def parse_iso_datetime(date_string: str, add_timezone: bool = True) -> datetime:
     # Normalizar la cadena de fecha
     date_string = date_string.strip()
     
-    # Manejar diferentes formatos de timezone
-    if date_string.endswith('Z'):
-        # Formato con Z (Zulu time)
-        date_string = date_string.replace('Z', '+00:00')
-    elif '+' not in date_string and '-' not in date_string[-6:]:
-        # No tiene timezone, agregar UTC si se solicita
-        if add_timezone:
-            date_string += '+00:00'
-    
     try:
-        # Intentar parsear con timezone
+        # Python 3.11+: fromisoformat acepta 'Z' y offsets directamente (implementado en C)
         dt = datetime.fromisoformat(date_string)
-        
-        # Si no tiene timezone y no se solicitó agregar, retornar sin timezone
-        if not add_timezone and dt.tzinfo is None:
-            return dt
-            
-        # Si no tiene timezone pero se solicitó agregar, agregar UTC
-        if dt.tzinfo is None and add_timezone:
-            dt = dt.replace(tzinfo=timezone.utc)
-            
-        return dt
     except ValueError as e:
         raise ValueError(f"Formato de fecha inválido: {date_string}. Error: {str(e)}")
 
+    # Si no tiene timezone y se solicitó agregar, asumir UTC
+    if dt.tzinfo is None and add_timezone:
+        dt = dt.replace(tzinfo=timezone.utc)
+
+    return dt
+
 def handle_db_errors(func: Callable) -> Callable:
     """
     Decorator para manejo centralizado de errores de base de datos y validación.
@@ -89,20 +105,24 @@ def handle_db_errors(func: Callable) -> Callable:
             
             return func(*args, **kwargs)
         except ValidationError as e:
-            logger.warning(f"Error de validación: {e.messages}")
+            if logger.isEnabledFor(logging.WARNING):
+                logger.warning("Error de validación: %s", e.messages)
             return {"message": "Datos inválidos", "errors": e.messages}, 400
         except werkzeug.exceptions.HTTPException as e:
             # Permitir que las excepciones HTTP se propaguen sin modificar
             raise e
         except Exception as e:
             db.session.rollback()
-            import uuid
             error_id = uuid.uuid4().hex[:8]
-            logger.error(f"Error en {func.__name__} [{error_id}]: {str(e)}", exc_info=True)
             
             # Si es un error de integridad de SQLAlchemy, podemos traducirlo a un 409 o 400
-            from sqlalchemy.exc import IntegrityError
-            if isinstance(e, IntegrityError):
+            is_integrity_error = isinstance(e, IntegrityError)
+            # Los errores de integridad son esperables (4xx): el traceback solo en DEBUG
+            logger.error(
+                "Error en %s [%s]: %s", func.__name__, error_id, e,
+                exc_info=not is_integrity_error or logger.isEnabledFor(logging.DEBUG)
+            )
+            if is_integrity_error:
                 err_msg = str(e.orig).lower() if hasattr(e, 'orig') else ""
                 if "unique" in err_msg or "duplicado" in err_msg:
                     return {"message": "El registro ya existe o entra en conflicto con un registro único.", "error_id": error_id}, 409
@@ -113,6 +133,17 @@ def handle_db_errors(func: Callable) -> Callable:
             return {"message": "Error interno del servidor", "error_id": error_id}, 500
     return wrapper
 
+def _obtener_claims() -> Dict[str, Any]:
+    """
+    Verifica el JWT una sola vez por request y reutiliza los claims decodificados.
+    Evita repetir la verificación HMAC cuando se apilan varios decoradores.
+    """
+    claims = g.get('jwt_claims')
+    if claims is None:
+        verify_jwt_in_request()
+        claims = g.jwt_claims = get_jwt()
+    return claims
+
 def rol_requerido(*roles_permitidos: str) -> Callable:
     """
     Decorador para restringir acceso basado en roles.
@@ -127,29 +158,27 @@ def rol_requerido(*roles_permitidos: str) -> Callable:
         @wraps(fn)
         def wrapper(*args: Any, **kwargs: Any) -> Union[Tuple[Dict[str, Any], int], Any]:
             try:
-                # Verificar token JWT
-                verify_jwt_in_request()
-                
-                # Obtener claims
-                claims = get_jwt()
+                # Verificar token JWT y obtener claims
+                claims = _obtener_claims()
                 rol_usuario = claims.get('rol')
                 
                 # Verificar si el rol está permitido
                 if rol_usuario not in roles_permitidos:
-                    logger.warning(f"Acceso denegado: Usuario con rol '{rol_usuario}' intentó acceder a ruta restringida")
+                    if logger.isEnabledFor(logging.WARNING):
+                        logger.warning("Acceso denegado: Usuario con rol '%s' intentó acceder a ruta restringida", rol_usuario)
                     return {
                         "error": "Acceso denegado",
                         "mensaje": "No tiene permisos suficientes para esta acción",
                         "required_roles": list(roles_permitidos),
                         "current_role": rol_usuario
                     }, 403
-                
-                # Si el rol es válido, continuar
-                return fn(*args, **kwargs)
-                
             except Exception as e:
-                logger.error(f"Error en verificación de rol: {str(e)}", exc_info=True)
+                logger.error("Error en verificación de rol: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
                 return {"error": "Error en verificación de acceso"}, 401
+
+            # Si el rol es válido, continuar: los errores del recurso (404, validación,
+            # BD) los maneja handle_db_errors, no se reportan como fallo de acceso
+            return fn(*args, **kwargs)
         return wrapper
     return decorator
 
@@ -168,16 +197,19 @@ def mismo_almacen_o_admin(fn: Callable) -> Callable:
     @wraps(fn)
     def wrapper(*args: Any, **kwargs: Any) -> Union[Tuple[Dict[str, Any], int], Any]:
         try:
-            # Verificar token JWT
-            verify_jwt_in_request()
-            
-            # Obtener claims
-            claims = get_jwt()
+            # Verificar token JWT y obtener claims
+            claims = _obtener_claims()
             
             # Si es admin, permitir acceso
             if claims.get('rol') == 'admin':
                 return fn(*args, **kwargs)
             
+            # Convertir una sola vez el almacén del usuario (los claims JWT no cambian en el request)
+            usuario_almacen_id = claims.get('almacen_id')
+            if usuario_almacen_id is not None:
+                usuario_almacen_id = int(usuario_almacen_id)
+            username = claims.get('username')
+
             # Verificar si está intentando acceder a datos de otro almacén
             almacen_id_request = kwargs.get('almacen_id')
             if almacen_id_request is not None:
@@ -191,37 +223,38 @@ def mismo_almacen_o_admin(fn: Callable) -> Callable:
                     }), 400
                     
                 # Verificar si el almacén coincide con el del usuario
-                usuario_almacen_id = claims.get('almacen_id')
                 if usuario_almacen_id is None:
                     return ({
                         'message': 'Usuario sin almacén asignado',
                         'error': 'almacen_no_asignado'
                     }), 403
                     
-                if int(almacen_id_request) != int(usuario_almacen_id):
-                    logger.warning(f"Intento de acceso a almacén no autorizado: Usuario {claims.get('username')} intentó acceder a almacén {almacen_id_request}")
+                if almacen_id_request != usuario_almacen_id:
+                    logger.warning("Intento de acceso a almacén no autorizado: Usuario %s intentó acceder a almacén %s", username, almacen_id_request)
                     return ({
                         'message': 'No tiene permiso para acceder a este almacén',
                         'error': 'acceso_denegado'
                     }), 403
                     
-            # Verificar almacén en datos JSON para métodos POST/PUT
-            if request.is_json and request.method in ['POST', 'PUT']:
-                data = request.get_json()
+            # Verificar almacén en datos JSON para métodos POST/PUT.
+            # Cuerpos vacíos o multipart (subida de archivos) no pasan por el parser JSON;
+            # el JSON parseado queda en caché para la vista.
+            if request.method in ('POST', 'PUT') and request.is_json and request.content_length:
+                data = request.get_json(silent=True, cache=True)
                 if data and 'almacen_id' in data:
                     try:
                         almacen_id_json = int(data['almacen_id'])
-                        if almacen_id_json != int(claims.get('almacen_id', 0)):
-                            logger.warning(f"Intento de modificación de almacén no autorizado: Usuario {claims.get('username')}")
-                            return ({
-                                'message': 'No tiene permiso para modificar este almacén',
-                                'error': 'acceso_denegado'
-                            }), 403
                     except (ValueError, TypeError):
                         return ({
                             'message': 'ID de almacén inválido en datos',
                             'error': 'parametro_invalido'
                         }), 400
+                    if almacen_id_json != usuario_almacen_id:
+                        logger.warning("Intento de modificación de almacén no autorizado: Usuario %s", username)
+                        return ({
+                            'message': 'No tiene permiso para modificar este almacén',
+                            'error': 'acceso_denegado'
+                        }), 403
             
             return fn(*args, **kwargs)
             
@@ -229,32 +262,38 @@ def mismo_almacen_o_admin(fn: Callable) -> Callable:
             # Permitir que las excepciones HTTP se propaguen sin modificar
             raise e
         except Exception as e:
-            logger.error(f"Error en verificación de almacén: {str(e)}", exc_info=True)
+            logger.error("Error en verificación de almacén: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
             return {"error": "Error en verificación de acceso"}, 401
     return wrapper
 
 def validate_pagination_params() -> Tuple[int, int]:
     """
     Extrae y valida parámetros de paginación de la request.
+    El resultado se memoiza en ``g`` para el resto de la request.
     
     Returns:
         Tuple[int, int]: Una tupla con (page, per_page).
     """
-    from flask import has_request_context
     if not has_request_context():
         return 1, config.DEFAULT_ITEMS_PER_PAGE
 
+    cached = g.get('_paginacion')
+    if cached is not None:
+        return cached
+
+    args = request.args
     try:
-        page = max(1, int(request.args.get('page', 1)))
+        page = max(1, int(args.get('page', 1)))
     except (ValueError, TypeError):
         page = 1
         
     try:
-        per_page = min(int(request.args.get('per_page', config.DEFAULT_ITEMS_PER_PAGE)), config.MAX_ITEMS_PER_PAGE)
+        per_page = max(1, min(int(args.get('per_page', config.DEFAULT_ITEMS_PER_PAGE)), config.MAX_ITEMS_PER_PAGE))
     except (ValueError, TypeError):
         per_page = config.DEFAULT_ITEMS_PER_PAGE
         
-    return page, per_page
+    g._paginacion = (page, per_page)
+    return g._paginacion
 
 def create_pagination_response(items: List[Any], pagination: Any) -> Dict[str, Any]:
     """
@@ -277,6 +316,41 @@ def create_pagination_response(items: List[Any], pagination: Any) -> Dict[str, A
         }
     }
 
+def encode_cursor(values: Tuple[Any, ...]) -> str:
+    """
+    Codifica los valores de orden de la última fila devuelta como cursor opaco
+    para paginación keyset.
+
+    Args:
+        values (Tuple[Any, ...]): Valores serializables en JSON (p. ej. fecha ISO e id).
+
+    Returns:
+        str: Cursor en base64 url-safe, sin relleno.
+    """
+    return base64.urlsafe_b64encode(orjson.dumps(list(values))).rstrip(b'=').decode('ascii')
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """
+    Decodifica un cursor generado por encode_cursor.
+
+    Args:
+        cursor (str): Cursor recibido del cliente.
+        size (int): Cantidad de valores esperada.
+
+    Returns:
+        List[Any]: Valores de orden de la última fila de la página anterior.
+
+    Raises:
+        ValueError: Si el cursor no es válido.
+    """
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, orjson.JSONDecodeError, ValueError):
+        raise ValueError("Cursor de paginación inválido") from None
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Cursor de paginación inválido")
+    return values
+
 def paginar(query, schema=None):
     """
     Pagina una consulta SQLAlchemy y opcionalmente serializa con un schema Marshmallow.
@@ -291,14 +365,69 @@ def paginar(query, schema=None):
         
     return create_pagination_response(items, pagination)
 
+def versionar_cache(clave: str, *modelos: type) -> None:
+    """
+    Incrementa en Redis el contador `clave` cada vez que se confirma una transacción que
+    insertó, modificó o eliminó filas de `modelos`, también con UPDATE/DELETE en bloque
+    (p. ej. Venta.recalcular_estados). Las cachés que incluyen el contador en su clave
+    quedan invalidadas sin tener que llamar a nada desde cada recurso que escribe.
+
+    Args:
+        clave (str): Clave del contador en Redis.
+        *modelos (type): Clases de modelo cuyos cambios invalidan la caché.
+    """
+    marca = f'version_cache:{clave}'
+
+    @event.listens_for(db.session, 'after_flush')
+    def _marcar_cambios(session, flush_context):
+        if any(isinstance(obj, modelos) for obj in (*session.new, *session.dirty, *session.deleted)):
+            session.info[marca] = True
+
+    @event.listens_for(db.session, 'do_orm_execute')
+    def _marcar_cambios_en_bloque(orm_execute_state):
+        mapper = orm_execute_state.bind_mapper
+        if (orm_execute_state.is_update or orm_execute_state.is_delete) \
+                and mapper is not None and issubclass(mapper.class_, modelos):
+            orm_execute_state.session.info[marca] = True
+
+    @event.listens_for(db.session, 'after_commit')
+    def _invalidar(session):
+        if not session.info.pop(marca, False) or redis_client is None:
+            return
+        try:
+            redis_client.incr(clave)
+        except redis.RedisError as e:
+            logger.warning(f"No se pudo invalidar la caché {clave}: {e}")
+
+    @event.listens_for(db.session, 'after_rollback')
+    def _descartar_cambios(session):
+        session.info.pop(marca, None)
+
+def version_cache(clave: str) -> Optional[str]:
+    """
+    Valor actual del contador registrado con versionar_cache.
+
+    Args:
+        clave (str): Clave del contador en Redis.
+
+    Returns:
+        Optional[str]: La versión ('0' si aún no hay cambios), o None si Redis no está
+        configurado o no responde (en ese caso no se debe usar la caché).
+    """
+    if redis_client is None:
+        return None
+    try:
+        return (redis_client.get(clave) or b'0').decode()
+    except redis.RedisError as e:
+        logger.warning(f"Caché {clave} no disponible: {e}")
+        return None
+
 def obtener_saldos_pendientes_clientes(cliente_ids: Optional[List[int]] = None) -> Dict[int, Decimal]:
     """
     Calcula el saldo pendiente total por cliente utilizando 1 sola consulta SQL agregada.
     Evita el problema N+1 de la propiedad Python.
     """
-    from decimal import Decimal
     from models import Venta, Pago
-    from sqlalchemy import select, func
 
     sub_pagos = (
         select(Pago.venta_id, func.coalesce(func.sum(Pago.monto), 0).label('total_pagado'))
@@ -312,13 +441,19 @@ def obtener_saldos_pendientes_clientes(cliente_ids: Optional[List[int]] = None)
             func.coalesce(func.sum(Venta.total - func.coalesce(sub_pagos.c.total_pagado, 0)), 0).label('saldo_total')
         )
         .outerjoin(sub_pagos, sub_pagos.c.venta_id == Venta.id)
+        # Mismo criterio que Cliente.saldo_pendiente; usa el índice parcial ix_ventas_cliente_open
+        .filter(Venta.estado_pago != 'pagado')
     )
 
     if cliente_ids:
         query = query.filter(Venta.cliente_id.in_(cliente_ids))
 
     query = query.group_by(Venta.cliente_id)
-    return {row[0]: Decimal(str(row[1])) for row in query.all()}
+    # Postgres ya devuelve Decimal para NUMERIC; solo se convierte si el driver no lo hace
+    return {
+        cliente_id: saldo if isinstance(saldo, Decimal) else Decimal(str(saldo))
+        for cliente_id, saldo in query.all()
+    }
 
 def validate_password(password: str) -> Tuple[bool, Optional[str]]:
     """
@@ -338,24 +473,154 @@ def validate_password(password: str) -> Tuple[bool, Optional[str]]:
     
     # Convertir a minúsculas para la validación
     lower_password = password.lower()
-    if not (re.search(r'[a-z]', lower_password) and re.search(r'[0-9]', lower_password)):
+    if not (_LETRA_PATTERN.search(lower_password) and _DIGITO_PATTERN.search(lower_password)):
         return False, "La contraseña debe contener al menos una letra y un número"
         
     return True, None
 
+def hash_password(password: str) -> str:
+    """
+    Genera el hash argon2id de una contraseña para guardarlo en Users.password.
+
+    Args:
+        password (str): Contraseña en texto plano.
+
+    Returns:
+        str: Hash en formato PHC ($argon2id$...).
+    """
+    return _password_hasher.hash(password)
+
+def password_necesita_rehash(stored_hash: str) -> bool:
+    """
+    Indica si un hash almacenado debe regenerarse: hashes heredados de werkzeug
+    o argon2 con parámetros distintos a los actuales.
+
+    Args:
+        stored_hash (str): Hash guardado en Users.password.
+
+    Returns:
+        bool: True si conviene re-hashear la contraseña.
+    """
+    if not stored_hash.startswith('$argon2'):
+        return True
+    return _password_hasher.check_needs_rehash(stored_hash)
+
+def _comprobar_hash(stored_hash: str, password: str) -> bool:
+    if stored_hash.startswith('$argon2'):
+        try:
+            return _password_hasher.verify(stored_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    # Hashes heredados de werkzeug (pbkdf2/scrypt)
+    return check_password_hash(stored_hash, password)
+
+def verificar_password(stored_hash: str, password: str) -> bool:
+    """
+    Verifica una contraseña contra su hash almacenado, recordando durante unos
+    segundos las verificaciones exitosas para no repetir el hash (costoso a
+    propósito) en re-logins seguidos del mismo usuario.
+
+    La clave de caché es (hash almacenado, blake2b con clave aleatoria del proceso):
+    no se guarda la contraseña y un cambio de contraseña invalida la entrada.
+
+    Args:
+        stored_hash (str): Hash guardado en Users.password.
+        password (str): Contraseña recibida.
+
+    Returns:
+        bool: True si la contraseña es correcta.
+    """
+    digest = hashlib.blake2b(password.encode('utf-8'), key=_PASSWORD_CACHE_KEY, digest_size=16).digest()
+    clave = (stored_hash, digest)
+    with _password_cache_lock:
+        if clave in _password_cache:
+            return True
+
+    if not _comprobar_hash(stored_hash, password):
+        return False
+
+    with _password_cache_lock:
+        _password_cache[clave] = True
+    return True
+
+# Revocación de tokens (opcional, requiere REDIS_URL); app.py registra el
+# token_in_blocklist_loader que consulta estas claves. Cada clave expira cuando ya
+# no queda ningún token vigente al que pueda aplicarse.
+JWT_BLOCKLIST_ENABLED = os.environ.get('JWT_BLOCKLIST_ENABLED') == '1' and redis_client is not None
+_JWT_VIDA_MAXIMA_SEGUNDOS = max(config.JWT_EXPIRES_HOURS_ADMIN, config.JWT_EXPIRES_HOURS_USER) * 3600
+
+def revocar_token(jwt_payload: Dict[str, Any]) -> bool:
+    """
+    Revoca un token concreto (logout) hasta su expiración.
+
+    Args:
+        jwt_payload (Dict[str, Any]): Claims del token (get_jwt()).
+
+    Returns:
+        bool: True si quedó revocado; False si la revocación no está habilitada o
+        Redis no responde.
+    """
+    if not JWT_BLOCKLIST_ENABLED:
+        return False
+    ttl = max(int(jwt_payload['exp'] - time.time()), 1)
+    try:
+        redis_client.setex(f"jwt:blocklist:{jwt_payload['jti']}", ttl, 1)
+    except redis.RedisError as e:
+        logger.error(f"No se pudo revocar el token {jwt_payload['jti']}: {e}")
+        return False
+    return True
+
+def revocar_tokens_usuario(user_id: int) -> bool:
+    """
+    Revoca todos los tokens emitidos hasta ahora para un usuario (cambio de
+    contraseña, rol o almacén, o usuario eliminado). Los logins posteriores
+    reciben tokens válidos.
+
+    Args:
+        user_id (int): ID del usuario (claim `sub`).
+
+    Returns:
+        bool: True si quedaron revocados; False si la revocación no está habilitada o
+        Redis no responde.
+    """
+    if not JWT_BLOCKLIST_ENABLED:
+        return False
+    try:
+        redis_client.setex(f"jwt:revoked_user:{user_id}", _JWT_VIDA_MAXIMA_SEGUNDOS, time.time())
+    except redis.RedisError as e:
+        logger.error(f"No se pudieron revocar los tokens del usuario {user_id}: {e}")
+        return False
+    return True
+
+def orjson_default(obj: Any) -> Any:
+    """Hook `default` de orjson para tipos no nativos (Decimal -> float)."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Tipo no serializable: {type(obj).__name__}")
+
+def dumps_json(data: Any, indent: bool = False) -> bytes:
+    """
+    Serializa a JSON con orjson (en C, sin copiar la estructura previamente).
+    datetime/date se emiten en ISO 8601 igual que `isoformat()`.
+    OPT_NON_STR_KEYS convierte las claves no string a string ({1: x} -> {"1": x}),
+    igual que hacía `json.dumps`: el cuerpo de la respuesta no cambia.
+    """
+    option = orjson.OPT_NON_STR_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(data, default=orjson_default, option=option)
+
 def make_json_serializable(data: Any) -> Any:
     """
     Recursively converts data to JSON-serializable format.
     Handles Decimal -> float, etc.
     """
-    import decimal
-    
     if isinstance(data, dict):
         return {k: make_json_serializable(v) for k, v in data.items()}
     elif isinstance(data, list):
         return [make_json_serializable(v) for v in data]
-    elif isinstance(data, decimal.Decimal):
+    elif isinstance(data, Decimal):
         return float(data)
     elif isinstance(data, (datetime, date)):
         return data.isoformat()
-    return data
\ No newline at end of file
+    return data
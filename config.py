@@ -12,4 +12,4 @@ DEFAULT_ITEMS_PER_PAGE = 10
 
 # File Uploads
 MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50 MB
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'pdf'}
+ALLOWED_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'pdf'})
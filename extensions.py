@@ -1,4 +1,8 @@
 import os
+import redis
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_migrate import Migrate
@@ -11,6 +15,22 @@ jwt = JWTManager()
 migrate = Migrate()
 swagger = Swagger()
 
+# Cliente Redis compartido (pool de conexiones creado de forma perezosa)
+redis_url = os.getenv("REDIS_URL")
+redis_client = redis.Redis.from_url(redis_url) if redis_url else None
+
+# Sesión HTTP compartida para APIs externas (Telegram, SUNAT): reutiliza las
+# conexiones TCP/TLS en lugar de abrir una nueva por llamada. Solo se reintentan
+# los fallos de conexión, para no duplicar POSTs que sí llegaron al servidor.
+http_session = requests.Session()
+_http_adapter = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(total=3, read=0, status=0, backoff_factor=0.3)
+)
+http_session.mount("https://", _http_adapter)
+http_session.mount("http://", _http_adapter)
+
 # Inicializar cliente de Supabase
 supabase_url = os.getenv("SUPABASE_URL")
 supabase_key = os.getenv("SUPABASE_KEY")
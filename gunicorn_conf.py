@@ -0,0 +1,53 @@
+# gunicorn_conf.py
+# Uso: gunicorn -c gunicorn_conf.py app:app
+import multiprocessing
+import os
+
+bind = f":{os.environ.get('PORT', '8080')}"
+
+# Workers gevent: cada worker atiende muchas peticiones concurrentes mientras
+# espera I/O (Postgres, Supabase, Gemini, Telegram) en lugar de bloquearse.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+# Importar la app una sola vez en el master: los workers comparten por copy-on-write
+# los módulos ya cargados (modelos, schemas, recursos) en lugar de reimportarlos.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# Con preload la app se importa en el master, antes de que el worker gevent aplique
+# sus parches: hay que parchear aquí, antes de que se importen ssl/socket/psycopg2.
+if worker_class == 'gevent' and preload_app:
+    from gevent import monkey
+    monkey.patch_all()
+
+
+def on_starting(server):
+    # Cada worker tiene su propio pool de SQLAlchemy (ver DB_POOL_SIZE en app.py):
+    # el total de conexiones posibles debe caber en el límite de Postgres/Supabase.
+    max_db = os.environ.get('DB_MAX_CONNECTIONS')
+    if not max_db:
+        return
+    por_worker = int(os.environ.get('DB_POOL_SIZE', 10)) + int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    total = workers * por_worker
+    if total > int(max_db):
+        server.log.warning(
+            "Hasta %s conexiones a la BD (%s workers x %s) superan DB_MAX_CONNECTIONS=%s; "
+            "reduzca GUNICORN_WORKERS, DB_POOL_SIZE o DB_MAX_OVERFLOW",
+            total, workers, por_worker, max_db
+        )
+
+
+def post_fork(server, worker):
+    # psycopg2 es una extensión C: sin este parche sus llamadas bloquean el hub de gevent
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+    # El pool de conexiones no debe compartirse entre procesos
+    if preload_app:
+        from app import app
+        from extensions import db
+        with app.app_context():
+            db.engine.dispose(close=False)
@@ -0,0 +1,21 @@
+-- Migración: Fecha de próxima compra precalculada en clientes
+-- Descripción: El filtro por fecha de /clientes/proyecciones casteaba a DATE la fecha
+-- estimada que calcula vista_clientes_proyeccion, lo que impide usar índices y recorre
+-- todos los clientes. Se guarda la fecha como columna generada (STORED) con índice btree.
+-- Misma prioridad que la proyección de la app: fecha manual si existe, si no
+-- ultima_fecha_compra + frecuencia_compra_dias.
+-- La fecha se toma en hora de Perú con AT TIME ZONE constante: una columna generada
+-- exige una expresión IMMUTABLE y timestamptz::date / timestamptz + interval no lo son.
+-- ADD COLUMN ... STORED reescribe la tabla (bloqueo exclusivo): ejecutar fuera de horario.
+
+ALTER TABLE clientes
+    ADD COLUMN IF NOT EXISTS proxima_compra_date DATE GENERATED ALWAYS AS (
+        COALESCE(
+            proxima_compra_manual,
+            (ultima_fecha_compra AT TIME ZONE 'America/Lima')::date + frecuencia_compra_dias
+        )
+    ) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cliente_proxima_compra
+    ON clientes (proxima_compra_date)
+    WHERE proxima_compra_date IS NOT NULL;
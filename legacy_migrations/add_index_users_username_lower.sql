@@ -0,0 +1,6 @@
+-- Migración: Índice funcional sobre LOWER(username) en users
+-- Descripción: El login compara LOWER(username) = :username en minúsculas; el índice
+-- único sobre username no sirve para esa comparación y Postgres recorría toda la tabla.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_username_lower
+    ON users (LOWER(username));
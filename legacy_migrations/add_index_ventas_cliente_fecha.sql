@@ -0,0 +1,7 @@
+-- Migración: Índice de ventas por cliente ordenadas por fecha descendente
+-- Descripción: El historial de un cliente (GET /clientes/proyecciones/<id>) pide sus
+-- ventas con ORDER BY fecha DESC; con este índice Postgres las lee ya ordenadas en
+-- lugar de ordenarlas tras filtrar por cliente_id.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ventas_cliente_fecha
+    ON ventas (cliente_id, fecha DESC);
@@ -0,0 +1,16 @@
+-- Migración: Índices para la exportación de proyecciones de clientes
+-- Descripción:
+--   ix_pedidos_cliente_id: conteo de pedidos por cliente (subconsulta correlacionada);
+--                          pedidos no tenía ningún índice sobre cliente_id
+--   ix_cliente_proy:       clientes con frecuencia_compra_dias, ordenados por
+--                          ultima_fecha_compra DESC (filtro y orden de la exportación)
+-- Las ventas por cliente ya están cubiertas por idx_ventas_cliente_estado e
+-- idx_ventas_cliente_fecha (cliente_id es su primera columna).
+-- Verificar con: EXPLAIN (ANALYZE, BUFFERS) sobre la consulta de la exportación
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pedidos_cliente_id
+    ON pedidos (cliente_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_cliente_proy
+    ON clientes (ultima_fecha_compra DESC)
+    WHERE frecuencia_compra_dias IS NOT NULL;
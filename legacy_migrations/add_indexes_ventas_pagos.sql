@@ -0,0 +1,10 @@
+-- Migración: Índices para saldos pendientes y consultas por rango de fechas
+-- Descripción:
+--   idx_ventas_almacen_fecha:  ventas de un almacén en un rango de fechas (dashboard, reportes)
+--   idx_pagos_venta:           SUM(pagos.monto) por venta (Venta.saldo_pendiente en SQL)
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ventas_almacen_fecha
+    ON ventas (almacen_id, fecha);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pagos_venta
+    ON pagos (venta_id);
@@ -0,0 +1,9 @@
+-- Migración: Índice parcial de ventas con saldo pendiente por cliente
+-- Descripción: La mayoría de las ventas históricas están pagadas; el saldo pendiente por
+-- cliente solo recorre las ventas con estado_pago <> 'pagado'. Este índice cubre solo esas
+-- filas, por lo que es pequeño y coincide exactamente con el predicado de la consulta.
+-- Verificar con: EXPLAIN ANALYZE SELECT ... WHERE cliente_id = ... AND estado_pago <> 'pagado'
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ventas_cliente_open
+    ON ventas (cliente_id)
+    WHERE estado_pago <> 'pagado';
@@ -0,0 +1,13 @@
+-- Migración: Índices trigram (pg_trgm) sobre clientes.nombre y clientes.ciudad
+-- Descripción: Los filtros ILIKE '%término%' del listado de clientes no pueden usar un
+-- índice B-tree y recorrían toda la tabla. Con un índice GIN gin_trgm_ops, Postgres
+-- resuelve el ILIKE con un bitmap scan; el mismo índice sirve para el operador de
+-- similitud (%) usado en la búsqueda difusa de clientes (bot de Telegram y voz).
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cliente_nombre_trgm
+    ON clientes USING gin (nombre gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cliente_ciudad_trgm
+    ON clientes USING gin (ciudad gin_trgm_ops);
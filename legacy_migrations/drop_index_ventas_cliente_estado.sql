@@ -0,0 +1,8 @@
+-- Migración: Eliminar idx_ventas_cliente_estado
+-- Descripción: Sus consultas ya las cubren otros dos índices de ventas:
+--   ix_ventas_cliente_open (parcial, estado_pago <> 'pagado'): saldos pendientes por
+--     cliente, el uso para el que se creó, con un índice mucho más pequeño.
+--   idx_ventas_cliente_fecha: cualquier otra búsqueda de ventas por cliente_id.
+-- Un índice menos que mantener en cada INSERT/UPDATE de ventas.
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_ventas_cliente_estado;
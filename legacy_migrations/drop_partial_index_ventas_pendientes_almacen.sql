@@ -0,0 +1,8 @@
+-- Migración: Eliminar ix_ventas_pendientes_almacen_fecha
+-- Descripción: Tenía las mismas columnas (almacen_id, fecha) que idx_ventas_almacen_fecha,
+-- solo restringido a estado_pago IN ('pendiente', 'parcial'). Las ventas pendientes del
+-- dashboard se resuelven con idx_ventas_almacen_fecha, que ya existe para el listado y los
+-- reportes por almacén y fecha; se evita mantener dos índices sobre las mismas columnas en
+-- cada INSERT/UPDATE de ventas.
+
+DROP INDEX CONCURRENTLY IF EXISTS ix_ventas_pendientes_almacen_fecha;
@@ -1,5 +1,7 @@
 # SQLAlchemy instance is imported from extensions.py via `db`
-from sqlalchemy import CheckConstraint, UniqueConstraint, Index, func
+from sqlalchemy import CheckConstraint, UniqueConstraint, Index, event, func, select, case, update
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import column_property
 from datetime import datetime, timezone
 from extensions import db
 from decimal import Decimal
@@ -22,6 +24,11 @@ class Users(db.Model):
     movimientos = db.relationship('Movimiento', back_populates='usuario')
     almacen = db.relationship('Almacen', backref=db.backref('usuarios', lazy=True))
 
+    __table_args__ = (
+        # Login busca por func.lower(username): índice funcional para evitar seq scan
+        Index('ix_users_username_lower', func.lower(username)),
+    )
+
     def __repr__(self):
         return f'<User {self.username}>'
 
@@ -155,28 +162,41 @@ class Venta(db.Model):
     # Relaciones
     vendedor = db.relationship('Users')
     cliente = db.relationship('Cliente', back_populates='ventas')
-    detalles = db.relationship('VentaDetalle', backref='venta', lazy=True, cascade="all, delete-orphan")
-    pagos = db.relationship("Pago", backref="venta", lazy=True, cascade="all, delete-orphan")
+    # selectin: al cargar N ventas, detalles y pagos llegan en una consulta IN cada uno
+    # (saldo_pendiente y la serialización los recorren siempre)
+    detalles = db.relationship('VentaDetalle', back_populates='venta', lazy='selectin', cascade="all, delete-orphan")
+    pagos = db.relationship("Pago", back_populates="venta", lazy='selectin', cascade="all, delete-orphan")
 
-    @property
+    @hybrid_property
     def saldo_pendiente(self):
-        total_pagado = sum(pago.monto for pago in self.pagos)
+        total_pagado = sum((pago.monto for pago in self.pagos), Decimal('0'))
         return self.total - total_pagado
 
-    def actualizar_estado(self, **kwargs):
+    @saldo_pendiente.expression
+    def saldo_pendiente(cls):
+        # En SQL: total menos la suma de pagos, como subconsulta correlacionada.
+        # Permite filtrar/ordenar/agregar por saldo sin cargar Venta.pagos.
+        return cls.total - (
+            select(func.coalesce(func.sum(Pago.monto), 0))
+            .where(Pago.venta_id == cls.id)
+            .correlate_except(Pago)
+            .scalar_subquery()
+        )
+
+    def actualizar_estado(self, total_pagado=None, **kwargs):
         """
         Actualiza el estado de pago de la venta basándose en la suma
         directa de los pagos en la base de datos para mayor fiabilidad.
+        Si el llamador ya conoce el total pagado (p. ej. calculado para varias
+        ventas en una sola consulta) puede pasarlo en `total_pagado`.
         """
-        # Se importa aquí para evitar dependencia circular
-        from models import Pago
-
-        # Consulta directa a la BD para obtener la suma real de pagos,
-        # incluyendo los que acaban de ser "flusheados".
-        total_pagado_query = db.session.query(func.sum(Pago.monto)).filter(Pago.venta_id == self.id).scalar()
+        if total_pagado is None:
+            # Consulta directa a la BD para obtener la suma real de pagos,
+            # incluyendo los que acaban de ser "flusheados".
+            total_pagado_query = db.session.query(func.sum(Pago.monto)).filter(Pago.venta_id == self.id).scalar()
 
-        # Si no hay pagos, el resultado es None, lo convertimos a Decimal(0)
-        total_pagado = total_pagado_query or Decimal('0.0')
+            # Si no hay pagos, el resultado es None, lo convertimos a Decimal(0)
+            total_pagado = total_pagado_query or Decimal('0.0')
 
         saldo = self.total - total_pagado
 
@@ -188,10 +208,46 @@ class Venta(db.Model):
         else:
             self.estado_pago = 'pendiente'
 
+    @classmethod
+    def recalcular_estados(cls, venta_ids):
+        """
+        Versión en lote de actualizar_estado: recalcula estado_pago de varias
+        ventas con un solo UPDATE, sumando los pagos en SQL en lugar de una
+        consulta por venta. Las ventas sin pagos quedan como 'pendiente'.
+        """
+        if not venta_ids:
+            return
+        total_pagado = func.coalesce(
+            select(func.sum(Pago.monto)).where(Pago.venta_id == cls.id).scalar_subquery(), 0
+        )
+        nuevo_estado = case(
+            (func.abs(cls.total - total_pagado) <= Decimal('0.001'), 'pagado'),
+            (total_pagado > 0, 'parcial'),
+            else_='pendiente'
+        )
+        db.session.execute(
+            update(cls)
+            .where(cls.id.in_(venta_ids))
+            .values(estado_pago=nuevo_estado)
+            .execution_options(synchronize_session='fetch')
+        )
+
     __table_args__ = (
         CheckConstraint("tipo_pago IN ('contado', 'credito')"),
         CheckConstraint("estado_pago IN ('pendiente', 'parcial', 'pagado')"),
-        CheckConstraint("estado IN ('pedido', 'completado')")
+        CheckConstraint("estado IN ('pedido', 'completado')"),
+        # Parcial: solo ventas con deuda (la mayoría del histórico está pagado), para
+        # los saldos pendientes por cliente que filtran estado_pago <> 'pagado'
+        # (Cliente.saldo_pendiente, obtener_saldos_pendientes_clientes, bot de Telegram)
+        Index('ix_ventas_cliente_open', 'cliente_id',
+              postgresql_where=db.text("estado_pago <> 'pagado'")),
+        # Ventas de un almacén por rango de fechas (listado, dashboard, reportes). También
+        # sirve a las ventas pendientes del dashboard: una sola estructura en lugar de un
+        # índice parcial con las mismas columnas que habría que mantener en cada escritura
+        Index('idx_ventas_almacen_fecha', 'almacen_id', 'fecha'),
+        # Historial de un cliente ordenado por fecha (detalle de proyección, listado de
+        # ventas filtrado por cliente_id)
+        Index('idx_ventas_cliente_fecha', 'cliente_id', fecha.desc()),
     )
 
 class VentaDetalle(db.Model):
@@ -206,6 +262,7 @@ class VentaDetalle(db.Model):
     updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), onupdate=db.func.now())
 
     # Relación
+    venta = db.relationship('Venta', back_populates='detalles')
     presentacion = db.relationship('PresentacionProducto')
     lote = db.relationship('Lote')
 
@@ -249,25 +306,75 @@ class Cliente(db.Model):
     ultimo_contacto = db.Column(db.DateTime(timezone=True), nullable=True)  # Fecha del último contacto (llamada, etc.)
     created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
     updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), onupdate=db.func.now())
+    # Próxima compra (manual o ultima_fecha_compra + frecuencia, en hora de Perú).
+    # Columna generada STORED e indexada en Postgres, ver
+    # legacy_migrations/add_cliente_proxima_compra_date.sql; la app nunca la escribe.
+    # deferred y sin server_default: no entra en los SELECT ni en el RETURNING de los
+    # INSERT de Cliente, solo en las consultas que la piden (lista de proyecciones)
+    proxima_compra_date = db.deferred(db.Column(db.Date, server_onupdate=db.FetchedValue()))
 
     almacen_preferido_id = db.Column(db.Integer, db.ForeignKey('almacenes.id', ondelete='SET NULL'), nullable=True)
     almacen_preferido = db.relationship('Almacen', foreign_keys=[almacen_preferido_id])
 
     ventas = db.relationship('Venta', back_populates='cliente', lazy=True)
 
-    @property
-    def saldo_pendiente(self):
-        if hasattr(self, '_saldo_pendiente_cached'):
-            return self._saldo_pendiente_cached
-        return sum(
-            venta.total - sum(pago.monto for pago in venta.pagos)
-            for venta in self.ventas
-            if venta.estado_pago != 'pagado'
+    __table_args__ = (
+        # Exportación de proyecciones: solo clientes con frecuencia, por última compra
+        Index('ix_cliente_proy', ultima_fecha_compra.desc(),
+              postgresql_where=db.text('frecuencia_compra_dias IS NOT NULL')),
+    )
+
+    @staticmethod
+    def _saldo_pendiente_sql(cliente_id):
+        # Total de las ventas no pagadas menos lo ya pagado en ellas: dos subconsultas
+        # agregadas que usan ix_ventas_cliente_open e idx_pagos_venta, sin cargar
+        # Cliente.ventas ni Venta.pagos
+        abiertas = (Venta.cliente_id == cliente_id, Venta.estado_pago != 'pagado')
+        total_ventas = (
+            select(func.coalesce(func.sum(Venta.total), 0))
+            .where(*abiertas)
+            .correlate_except(Venta)
+            .scalar_subquery()
+        )
+        total_pagado = (
+            select(func.coalesce(func.sum(Pago.monto), 0))
+            .join(Venta, Pago.venta_id == Venta.id)
+            .where(*abiertas)
+            .correlate_except(Venta, Pago)
+            .scalar_subquery()
         )
+        return total_ventas - total_pagado
+
+    # Se calcula con una sola consulta en cada acceso. Los listados que ya obtienen los
+    # saldos en lote (obtener_saldos_pendientes_clientes) lo asignan; ese valor se
+    # descarta al expirar o refrescar la instancia (ver _descartar_saldo_asignado).
+    @hybrid_property
+    def saldo_pendiente(self):
+        saldo = self.__dict__.get('_saldo_pendiente')
+        if saldo is not None:
+            return saldo
+        if self.id is None:
+            return Decimal('0')
+        saldo = db.session.scalar(select(self._saldo_pendiente_sql(self.id)))
+        return saldo if isinstance(saldo, Decimal) else Decimal(str(saldo or 0))
+
+    @saldo_pendiente.setter
+    def saldo_pendiente(self, valor):
+        self.__dict__['_saldo_pendiente'] = valor
+
+    @saldo_pendiente.expression
+    def saldo_pendiente(cls):
+        return cls._saldo_pendiente_sql(cls.id)
 
     def __repr__(self):
         return f'<Cliente {self.nombre}>'
 
+@event.listens_for(Cliente, 'expire')
+@event.listens_for(Cliente, 'refresh')
+def _descartar_saldo_asignado(target, *args):
+    # Tras un commit, expire() o refresh() el saldo asignado en lote ya puede no ser válido
+    target.__dict__.pop('_saldo_pendiente', None)
+
 
 class Pago(db.Model):
     __tablename__ = "pagos"
@@ -288,6 +395,7 @@ class Pago(db.Model):
     created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
     updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), onupdate=db.func.now())
 
+    venta = db.relationship('Venta', back_populates='pagos')
     usuario = db.relationship('Users')
 
     @property
@@ -303,6 +411,7 @@ class Pago(db.Model):
         CheckConstraint("metodo_pago IN ('efectivo', 'deposito', 'transferencia', 'tarjeta', 'yape_plin', 'otro')"),
         CheckConstraint("monto_depositado >= 0 OR monto_depositado IS NULL"),
         CheckConstraint("(depositado = true AND monto_depositado IS NOT NULL AND fecha_deposito IS NOT NULL) OR (depositado = false)"),
+        Index('idx_pagos_venta', 'venta_id'),
         Index('idx_pago_fecha_deposito', 'fecha_deposito'),
         Index('idx_pago_depositado_fecha', 'depositado', 'fecha_deposito'),
     )
@@ -349,20 +458,18 @@ class Movimiento(db.Model):
     created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
     updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), onupdate=db.func.now())
 
-    @property
-    def total_kg(self):
-        """Calcula el total de kilogramos para el movimiento."""
-        if self.presentacion and self.presentacion.capacidad_kg is not None:
-            try:
-                # Asegurarse de que ambos valores son Decimal antes de multiplicar
-                cantidad_decimal = Decimal(str(self.cantidad))
-                capacidad_kg_decimal = Decimal(str(self.presentacion.capacidad_kg))
-                return cantidad_decimal * capacidad_kg_decimal
-            except Exception as e:
-                # Considera loggear este error en un sistema de logging real
-                print(f"Error al calcular total_kg para movimiento {self.id}: {e}")
-                return Decimal('0.00') # O manejar el error de otra manera
-        return Decimal('0.00')
+    # Total de kilogramos del movimiento (cantidad x capacidad_kg de la presentación),
+    # calculado por la BD en la misma consulta que carga el movimiento: no requiere
+    # cargar self.presentacion. 0 si no hay presentación o no tiene capacidad.
+    total_kg = column_property(
+        func.coalesce(
+            select(cantidad * PresentacionProducto.capacidad_kg)
+            .where(PresentacionProducto.id == presentacion_id)
+            .correlate_except(PresentacionProducto)
+            .scalar_subquery(),
+            0
+        )
+    )
 
     __table_args__ = (
         CheckConstraint("tipo IN ('entrada', 'salida')"),
@@ -409,7 +516,7 @@ class Pedido(db.Model):
     cliente = db.relationship('Cliente', backref=db.backref('pedidos', lazy=True))
     almacen = db.relationship('Almacen')
     vendedor = db.relationship('Users')
-    detalles = db.relationship('PedidoDetalle', backref='pedido', lazy=True, cascade="all, delete-orphan")
+    detalles = db.relationship('PedidoDetalle', back_populates='pedido', lazy='selectin', cascade="all, delete-orphan")
     
     @property
     def total_estimado(self):
@@ -417,6 +524,7 @@ class Pedido(db.Model):
     
     __table_args__ = (
         CheckConstraint("estado IN ('programado', 'confirmado', 'entregado', 'cancelado')"),
+        Index('ix_pedidos_cliente_id', 'cliente_id'),
     )
 
 class PedidoDetalle(db.Model):
@@ -430,6 +538,7 @@ class PedidoDetalle(db.Model):
     updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), onupdate=db.func.now())
     
     # Relación
+    pedido = db.relationship('Pedido', back_populates='detalles')
     presentacion = db.relationship('PresentacionProducto')
 
 class Receta(db.Model):
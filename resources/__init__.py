@@ -1,5 +1,5 @@
 from .almacen_resource import AlmacenResource
-from .auth_resource import AuthResource
+from .auth_resource import AuthResource, LogoutResource
 from .chat_resource import ChatResource
 from .cliente_resource import ClienteExportResource, ClienteResource, ClienteProyeccionResource, ClienteProyeccionExportResource
 from .dashboard_resource import DashboardResource
@@ -24,10 +24,14 @@ from .venta_resource import VentaResource, VentaFormDataResource, VentaExportRes
 from .ventadetalle_resource import VentaDetalleResource
 from .voice_resource import VoiceCommandResource
 from .telegram_webhook_resource import TelegramWebhookResource, TelegramLinkResource
+from .transaccion_resource import TransaccionCompletaResource
+
+from flask_limiter.util import get_remote_address
 
 __all__ = [
     'AlmacenResource',
     'AuthResource',
+    'LogoutResource',
     'ChatResource',
     'ClienteExportResource',
     'ClienteProyeccionResource',
@@ -72,16 +76,28 @@ __all__ = [
     'VoiceCommandResource',
     'TelegramWebhookResource',
     'TelegramLinkResource',
+    'TransaccionCompletaResource',
 ]
 
-from resources.transaccion_resource import TransaccionCompletaResource
-
 def init_resources(api, limiter=None):
-    # ... (existing resources)
+    # Rate limits por recurso: Flask-RESTful aplica `decorators` al construir la vista,
+    # por eso se asignan antes de api.add_resource.
+    # Voice Commands (Gemini) - Rate limited: 20/minute & Auth: 10/minute
+    if limiter:
+        # /auth no lleva JWT: se limita por IP sin intentar decodificar un token
+        AuthResource.decorators = [
+            limiter.limit("10/minute", key_func=get_remote_address, error_message="Demasiados intentos de autenticación. Intenta nuevamente en un minuto.")
+        ]
+        VoiceCommandResource.decorators = [
+            limiter.limit("20/minute", error_message="Demasiados comandos de voz. Espera un momento.")
+        ]
+        TelegramWebhookResource.decorators = [limiter.exempt]
+
     api.add_resource(TransaccionCompletaResource, '/transacciones/venta-completa')
 
     # Autenticación y Usuarios
     api.add_resource(AuthResource, '/auth')
+    api.add_resource(LogoutResource, '/auth/logout')
     api.add_resource(UserResource, '/usuarios', '/usuarios/<int:user_id>')
     
     # Recursos Principales
@@ -149,12 +165,6 @@ def init_resources(api, limiter=None):
     # Chat
     api.add_resource(ChatResource, '/chat')
     
-    # Voice Commands (Gemini) - Rate limited: 20/minute & Auth: 10/minute
-    if limiter:
-        limiter.limit("10/minute", error_message="Demasiados intentos de autenticación. Intenta nuevamente en un minuto.")(AuthResource)
-        limiter.limit("20/minute", error_message="Demasiados comandos de voz. Espera un momento.")(VoiceCommandResource)
-        limiter.exempt(TelegramWebhookResource)
-    
     api.add_resource(VoiceCommandResource, '/voice/command')
     api.add_resource(TelegramWebhookResource, '/telegram/webhook/<string:webhook_token>')
     api.add_resource(TelegramLinkResource, '/telegram/vincular')
@@ -1,25 +1,40 @@
 from typing import Dict, Tuple, Union, Any
-from flask_restful import Resource, reqparse
-from flask_jwt_extended import create_access_token
-from werkzeug.security import check_password_hash
-from models import Users, Almacen
+from flask_restful import Resource
+from flask_jwt_extended import create_access_token, get_jwt, jwt_required
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from marshmallow import ValidationError
+from models import Users
+from schemas import login_schema
 from flask import request
-from common import validate_password
+from common import verificar_password, password_necesita_rehash, hash_password, revocar_token
+from extensions import db
 from datetime import timedelta
 import logging
+import secrets
 import config
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+# Expiración del token por rol, calculada una sola vez: (timedelta, segundos)
+_EXPIRES_ADMIN = timedelta(hours=config.JWT_EXPIRES_HOURS_ADMIN)
+_EXPIRES_USER = timedelta(hours=config.JWT_EXPIRES_HOURS_USER)
+_EXPIRES_ADMIN_PAR = (_EXPIRES_ADMIN, int(_EXPIRES_ADMIN.total_seconds()))
+_EXPIRES_USER_PAR = (_EXPIRES_USER, int(_EXPIRES_USER.total_seconds()))
+
+# Hash señuelo: si el usuario no existe se verifica contra él igualmente, para que
+# el tiempo de respuesta no revele qué nombres de usuario existen
+_DUMMY_HASH = hash_password(secrets.token_urlsafe(32))
+
 class AuthResource(Resource):
     def post(self) -> Tuple[Dict[str, Any], int]:
         try:
-            parser = reqparse.RequestParser()
-            parser.add_argument('username', type=str, required=True, help='El nombre de usuario es requerido')
-            parser.add_argument('password', type=str, required=True, help='La contraseña es requerida')
-            
-            data = parser.parse_args()
+            # Esquema instanciado una sola vez a nivel de módulo; acepta JSON o formulario
+            try:
+                data = login_schema.load(request.get_json(silent=True) or request.form)
+            except ValidationError as e:
+                return {'message': 'Datos inválidos', 'errors': e.messages}, 400
             
             # Sanitizar entradas
             username = data['username'].strip()
@@ -29,20 +44,30 @@ class AuthResource(Resource):
             if not username or len(username) < config.MIN_USERNAME_LENGTH:
                 return {'message': f'El nombre de usuario debe tener al menos {config.MIN_USERNAME_LENGTH} caracteres'}, 400
                 
-            # Find user by username (case insensitive)
-            usuario = Users.query.filter(Users.username.ilike(username)).first()
+            # Find user by username (case insensitive); el almacén llega en la misma consulta
+            usuario = Users.query.options(joinedload(Users.almacen)).filter(
+                func.lower(Users.username) == username.lower()
+            ).first()
             
-            # Verificación real de credenciales
-            if not usuario or not check_password_hash(usuario.password, password):
+            # Verificación real de credenciales (mismo costo exista o no el usuario)
+            stored_hash = usuario.password if usuario else _DUMMY_HASH
+            password_ok = verificar_password(stored_hash, password)
+            if not usuario or not password_ok:
                 # Log de intento fallido (sin exponer qué campo falló)
                 logger.warning(f"Intento de login fallido para el usuario: {username}")
                 return {'message': 'Credenciales inválidas'}, 401
+
+            # Migración gradual a argon2: re-hashear con la contraseña ya verificada
+            if password_necesita_rehash(usuario.password):
+                try:
+                    usuario.password = hash_password(password)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.warning(f"No se pudo actualizar el hash de contraseña de {username}: {e}")
             
             # Determinar expiración del token basado en el rol
-            if usuario.rol == 'admin':
-                expires = timedelta(hours=config.JWT_EXPIRES_HOURS_ADMIN)
-            else:
-                expires = timedelta(hours=config.JWT_EXPIRES_HOURS_USER)
+            expires, expires_in = _EXPIRES_ADMIN_PAR if usuario.rol == 'admin' else _EXPIRES_USER_PAR
                 
             # Crear token con datos mínimos necesarios
             access_token = create_access_token(
@@ -55,12 +80,8 @@ class AuthResource(Resource):
                 expires_delta=expires
             )
             
-            # Obtener nombre del almacén si existe
-            nombre_almacen = None
-            if usuario.almacen_id:
-                almacen = Almacen.query.get(usuario.almacen_id)
-                if almacen:
-                    nombre_almacen = almacen.nombre
+            # Obtener nombre del almacén si existe (precargado con joinedload)
+            nombre_almacen = usuario.almacen.nombre if usuario.almacen else None
             
             # Log de login exitoso
             logger.info(f"Login exitoso para usuario: {username}")
@@ -68,7 +89,7 @@ class AuthResource(Resource):
             return {
                 'access_token': access_token,
                 'token_type': 'Bearer',
-                'expires_in': int(expires.total_seconds()),
+                'expires_in': expires_in,
                 'user': {
                     'id': usuario.id,
                     'username': usuario.username,
@@ -81,3 +102,14 @@ class AuthResource(Resource):
         except Exception as e:
             logger.error(f"[{self.__class__.__name__}] Error en login: {str(e)}", exc_info=True)
             return {'message': 'Error en el servidor'}, 500
+
+class LogoutResource(Resource):
+    @jwt_required()
+    def post(self) -> Tuple[Dict[str, Any], int]:
+        """
+        Cierra la sesión revocando el token actual (requiere JWT_BLOCKLIST_ENABLED=1
+        y REDIS_URL). `revocado` indica si el token dejó de ser válido en el servidor;
+        si es False el cliente igualmente debe descartarlo.
+        """
+        revocado = revocar_token(get_jwt())
+        return {'message': 'Sesión cerrada', 'revocado': revocado}, 200
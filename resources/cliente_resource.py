@@ -1,25 +1,97 @@
 # ARCHIVO: cliente_resource.py
 from flask_restful import Resource, reqparse
 from flask_jwt_extended import jwt_required
-from flask import request, send_file
-from models import Cliente, Pedido, Venta, VistaClienteProyeccion
-from schemas import cliente_schema, clientes_schema, ClienteSchema, pedidos_schema
-from extensions import db
-from common import handle_db_errors, validate_pagination_params, create_pagination_response, rol_requerido
-import pandas as pd
+from flask import request, send_file, Response, stream_with_context
+from models import Almacen, Cliente, Pedido, Venta, VentaDetalle, Pago, VistaClienteProyeccion
+from schemas import cliente_schema
+from extensions import db, redis_client
+from common import handle_db_errors, validate_pagination_params, create_pagination_response, rol_requerido, encode_cursor, decode_cursor, versionar_cache, version_cache
+import orjson
+import xlsxwriter
 import re
 import io
+import csv
+import functools
+import hashlib
+import itertools
+import redis
+import tempfile
 import logging
-import calendar
-from sqlalchemy import func, desc, asc, cast, Date, case, text
+from sqlalchemy import func, desc, asc, or_, and_, select, tuple_
 from sqlalchemy.orm import aliased
 from sqlalchemy import orm
 from datetime import datetime, timezone, timedelta, date
+from decimal import Decimal
 from types import SimpleNamespace
+from urllib.parse import urlencode
+from collections import Counter
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+# Validaciones de entrada compiladas una sola vez al importar el módulo
+_TELEFONO_PATTERN = re.compile(r'^[\d\+\-\s()]+$')
+_TELEFONO_LONGITUD_PATTERN = re.compile(r'^[\d\+\-\s()]{3,20}$')
+_RUC_PATTERN = re.compile(r'^\d{11}$')
+_CIUDAD_INVALIDOS_PATTERN = re.compile(r'[^\w\s\-áéíóúÁÉÍÓÚñÑ]')
+
+# Encabezados de las exportaciones y formatos de xlsxwriter (uno por libro, compartido
+# por todas las celdas del encabezado o de la columna; las del cuerpo no llevan formato)
+COLUMNAS_EXPORT_CLIENTES = (
+    'ID', 'Nombre', 'Teléfono', 'Dirección', 'Ciudad',
+    'Saldo Pendiente', 'Última Compra', 'Frecuencia de Compra'
+)
+COLUMNAS_EXPORT_PROYECCIONES = (
+    'ID', 'Nombre', 'Teléfono', 'Dirección', 'Ciudad', 'Saldo Pendiente', 'Última Compra',
+    'Frecuencia Compra (días)', 'Próxima Compra Estimada', 'Total Ventas',
+    'Monto Total Comprado', 'Promedio por Compra', 'Total Pedidos'
+)
+_FORMATO_ENCABEZADO = {'bold': True, 'align': 'center'}
+_FORMATO_MONEDA = {'num_format': '#,##0.00'}
+EXPORT_SPOOL_MAX_BYTES = 16 * 1024 * 1024
+# Filas por consulta al recorrer la exportación de proyecciones con keyset
+EXPORT_LOTE_FILAS = 5000
+# Filas por bloque enviado en la exportación CSV
+EXPORT_LOTE_CSV = 500
+# Caché en Redis del .xlsx generado (solo si REDIS_URL está configurada). Cualquier
+# commit que cambie clientes, ventas o pagos incrementa la versión (el saldo depende
+# de los tres) y deja sin uso los archivos anteriores
+EXPORT_CACHE_TTL = 300
+EXPORT_CACHE_MAX_BYTES = 5 * 1024 * 1024
+_VERSION_EXPORT_CLIENTES = 'cliente_export:version'
+versionar_cache(_VERSION_EXPORT_CLIENTES, Cliente, Venta, Pago)
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# Caché en Redis de las páginas de GET /clientes por query string. Como en la
+# exportación, cualquier commit que cambie clientes, ventas o pagos (el saldo de cada
+# fila) o almacenes (almacen_preferido) incrementa la versión e invalida todas las páginas
+LISTA_CACHE_TTL = 30
+_VERSION_LISTA_CLIENTES = 'clientes_list:version'
+versionar_cache(_VERSION_LISTA_CLIENTES, Cliente, Venta, Pago, Almacen)
+
+def _dump_cliente_lista(c):
+    """
+    Equivalente a cliente_schema.dump(c) para el listado, sin recorrer los campos del
+    schema en cada fila. Debe devolver las mismas claves y formatos que ClienteSchema.
+    """
+    almacen = c.almacen_preferido
+    return {
+        'id': c.id,
+        'nombre': c.nombre,
+        'telefono': c.telefono,
+        'ruc': c.ruc,
+        'direccion': c.direccion,
+        'ciudad': c.ciudad,
+        'frecuencia_compra_dias': c.frecuencia_compra_dias,
+        'ultima_fecha_compra': c.ultima_fecha_compra.strftime('%Y-%m-%d') if c.ultima_fecha_compra else None,
+        'proxima_compra_manual': c.proxima_compra_manual.strftime('%Y-%m-%d') if c.proxima_compra_manual else None,
+        'ultimo_contacto': c.ultimo_contacto.isoformat() if c.ultimo_contacto else None,
+        'created_at': c.created_at.isoformat() if c.created_at else None,
+        'updated_at': c.updated_at.isoformat() if c.updated_at else None,
+        'almacen_preferido_id': c.almacen_preferido_id,
+        'almacen_preferido': {'id': almacen.id, 'nombre': almacen.nombre} if almacen else None,
+        'saldo_pendiente': str(Decimal(str(c.saldo_pendiente))) if c.saldo_pendiente is not None else None,
+    }
+
 class ClienteResource(Resource):
     @jwt_required()
     @handle_db_errors
@@ -27,172 +99,354 @@ class ClienteResource(Resource):
         """
         Obtiene cliente(s)
         - Con ID: Detalle completo con saldo pendiente
-        - Sin ID: Lista paginada con filtros (nombre, teléfono)
+        - Sin ID: Lista paginada con filtros (nombre, teléfono); con `cursor`
+          (tomado de pagination.next_cursor) pagina por keyset sobre id, y con
+          incluir_total=0 omite total/pages y solo informa has_next
         """
-        try:
-            # Si se solicita un cliente específico
-            if cliente_id:
-                cliente = Cliente.query.get_or_404(cliente_id)
-                return cliente_schema.dump(cliente), 200
-            
-            # Construir query con filtros
-            query = Cliente.query
-            
-            # Aplicar filtros para búsqueda por nombre o término de búsqueda genérico
-            search_term = request.args.get('nombre') or request.args.get('search')
-            if search_term:
-                # Usar ilike para búsqueda case-insensitive. SQLAlchemy previene inyección SQL.
-                query = query.filter(Cliente.nombre.ilike(f'%{search_term}%'))
-                
-            if telefono := request.args.get('telefono'):
-                # Validar formato básico de teléfono
-                if not re.match(r'^[\d\+\-\s()]+$', telefono):
-                    return {"error": "Formato de teléfono inválido"}, 400
-                query = query.filter(Cliente.telefono == telefono)
-
-            # Nuevo filtro por ciudad
-            if ciudad := request.args.get('ciudad'):
-                # Sanitizar input
-                ciudad = re.sub(r'[^\w\s\-áéíóúÁÉÍÓÚñÑ]', '', ciudad)
-                query = query.filter(Cliente.ciudad.ilike(f'%{ciudad}%'))
-    
-            # Paginación con validación
-            page, per_page = validate_pagination_params()
-            resultado = query.paginate(page=page, per_page=per_page, error_out=False)
-            
-            # Precalcular saldos en lote para evitar N+1
-            from common import obtener_saldos_pendientes_clientes
-            cliente_ids = [c.id for c in resultado.items]
-            if cliente_ids:
-                saldos_map = obtener_saldos_pendientes_clientes(cliente_ids)
-                for cliente in resultado.items:
-                    cliente._saldo_pendiente_cached = saldos_map.get(cliente.id, 0)
+        # Si se solicita un cliente específico
+        if cliente_id:
+            cliente = Cliente.query.get_or_404(cliente_id)
+            return cliente_schema.dump(cliente), 200
+
+        # Página ya generada para esta misma combinación de filtros y paginación
+        clave_cache = self._clave_cache_lista()
+        if clave_cache:
+            try:
+                cacheada = redis_client.get(clave_cache)
+                if cacheada:
+                    return orjson.loads(cacheada), 200
+            except redis.RedisError as e:
+                logger.warning(f"No se pudo leer la lista de clientes en caché: {e}")
+
+        # Construir query con filtros
+        query = Cliente.query
+
+        # Aplicar filtros para búsqueda por nombre o término de búsqueda genérico
+        search_term = request.args.get('nombre') or request.args.get('search')
+        if search_term:
+            # Usar ilike para búsqueda case-insensitive. SQLAlchemy previene inyección SQL.
+            query = query.filter(Cliente.nombre.ilike(f'%{search_term}%'))
+            
+        if telefono := request.args.get('telefono'):
+            # Validar formato básico de teléfono
+            if not _TELEFONO_PATTERN.match(telefono):
+                return {"error": "Formato de teléfono inválido"}, 400
+            query = query.filter(Cliente.telefono == telefono)
+
+        # Nuevo filtro por ciudad
+        if ciudad := request.args.get('ciudad'):
+            # Sanitizar input
+            ciudad = _CIUDAD_INVALIDOS_PATTERN.sub('', ciudad)
+            query = query.filter(Cliente.ciudad.ilike(f'%{ciudad}%'))
+
+        # id como orden: determinista entre páginas y base del cursor keyset
+        query = query.order_by(Cliente.id)
+
+        # Paginación con validación
+        page, per_page = validate_pagination_params()
+        if cursor := request.args.get('cursor'):
+            try:
+                ultimo_id, = decode_cursor(cursor, 1)
+            except ValueError as ve:
+                return {"error": str(ve)}, 400
+            if not isinstance(ultimo_id, int):
+                return {"error": "Cursor de paginación inválido"}, 400
+            items, next_cursor = self._paginar_keyset(query, ultimo_id, per_page)
+            respuesta = {
+                "data": [_dump_cliente_lista(c) for c in items],
+                "pagination": {"per_page": per_page, "next_cursor": next_cursor}
+            }
+        elif request.args.get('incluir_total') == '0':
+            # Sin total: una fila extra indica si hay página siguiente y Postgres no
+            # necesita contar todas las filas que cumplen los filtros
+            items, has_next = self._paginar_sin_total(query, page, per_page)
+            respuesta = {
+                "data": [_dump_cliente_lista(c) for c in items],
+                "pagination": {
+                    "page": page,
+                    "per_page": per_page,
+                    "has_next": has_next,
+                    "next_cursor": encode_cursor((items[-1].id,)) if has_next else None
+                }
+            }
+        else:
+            resultado = self._paginar_con_saldos(query, page, per_page)
 
             # Respuesta estandarizada
-            return create_pagination_response(clientes_schema.dump(resultado.items), resultado), 200
-            
-        except Exception as e:
-            logger.error(f"Error al obtener clientes: {str(e)}")
-            db.session.rollback()
-            return {"error": "Error al procesar la solicitud"}, 500
+            respuesta = create_pagination_response([_dump_cliente_lista(c) for c in resultado.items], resultado)
+            has_next = page < resultado.pages
+            respuesta['pagination']['has_next'] = has_next
+            respuesta['pagination']['next_cursor'] = encode_cursor((resultado.items[-1].id,)) if has_next else None
+        if clave_cache:
+            try:
+                redis_client.setex(clave_cache, LISTA_CACHE_TTL, orjson.dumps(respuesta))
+            except redis.RedisError as e:
+                logger.warning(f"No se pudo guardar la lista de clientes en caché: {e}")
+        return respuesta, 200
+
+
+    @staticmethod
+    def _clave_cache_lista():
+        """Clave en Redis de la página pedida: versión de la lista + query string normalizado."""
+        version = version_cache(_VERSION_LISTA_CLIENTES)
+        if version is None:
+            return None
+        args = urlencode(sorted(request.args.items(multi=True)))
+        return f"clientes_list:{version}:{hashlib.blake2b(args.encode(), digest_size=8).hexdigest()}"
+
+    @staticmethod
+    def _paginar_keyset(query, ultimo_id, per_page):
+        """
+        Página siguiente al id `ultimo_id` con WHERE id > ultimo_id en lugar de
+        OFFSET: el costo no crece con la profundidad de la página. Una fila extra
+        indica si hay página siguiente, sin COUNT(*).
+        """
+        items, has_next = ClienteResource._leer_con_saldos(query.filter(Cliente.id > ultimo_id), per_page)
+        next_cursor = encode_cursor((items[-1].id,)) if has_next else None
+        return items, next_cursor
+
+    @staticmethod
+    def _paginar_sin_total(query, page, per_page):
+        """Página `page` con LIMIT/OFFSET pero sin COUNT: devuelve (items, has_next)."""
+        return ClienteResource._leer_con_saldos(query.offset((page - 1) * per_page), per_page)
+
+    @staticmethod
+    def _leer_con_saldos(query, per_page):
+        """
+        Hasta `per_page` clientes con su saldo y almacén preferido en una consulta.
+        Se pide una fila extra: si llega, hay página siguiente (sin COUNT(*)).
+        """
+        filas = query.options(
+            orm.joinedload(Cliente.almacen_preferido)
+        ).add_columns(Cliente.saldo_pendiente.label('saldo')).limit(per_page + 1).all()
+
+        items = []
+        for cliente, saldo in filas[:per_page]:
+            cliente.saldo_pendiente = saldo
+            items.append(cliente)
+        return items, len(filas) > per_page
+
+    @staticmethod
+    def _paginar_con_saldos(query, page, per_page):
+        """
+        Página de clientes en una sola consulta: el saldo pendiente (subconsultas
+        correlacionadas), el almacén preferido (JOIN) y el total de filas
+        (COUNT(*) OVER ()) viajan junto a cada fila, en lugar de un COUNT aparte,
+        una consulta de saldos y una por almacén.
+        """
+        filas = query.options(orm.joinedload(Cliente.almacen_preferido)).add_columns(
+            Cliente.saldo_pendiente.label('saldo'),
+            func.count().over().label('total_filas')
+        ).limit(per_page).offset((page - 1) * per_page).all()
+
+        items = []
+        for cliente, saldo, _ in filas:
+            cliente.saldo_pendiente = saldo
+            items.append(cliente)
+
+        if filas:
+            total = filas[0].total_filas
+        elif page > 1:
+            # Página fuera de rango: el total no llega con las filas
+            total = query.order_by(None).count()
+        else:
+            total = 0
+
+        return SimpleNamespace(
+            items=items, total=total, page=page, per_page=per_page,
+            pages=-(-total // per_page) if per_page else 0
+        )
 
     @jwt_required()
     @rol_requerido('admin', 'gerente', 'usuario')
     @handle_db_errors
     def post(self):
         """Crea nuevo cliente con validación de datos"""
-        try:
-            # Validar que sea JSON
-            if not request.is_json:
-                return {"error": "Se esperaba contenido JSON"}, 400
-                
-            data = request.get_json()
-            if not data:
-                return {"error": "Datos JSON vacíos o inválidos"}, 400
-            
-            # Validar campos requeridos
-            if not data.get('nombre'):
-                return {"error": "El nombre del cliente es obligatorio"}, 400
-            
-            # Validar teléfono si está presente
-            if telefono := data.get('telefono'):
-                if not re.match(r'^[\d\+\-\s()]{3,20}$', telefono):
-                    return {"error": "Formato de teléfono inválido"}, 400
-            
-            # Validar RUC si está presente
-            if ruc := data.get('ruc'):
-                if not re.match(r'^\d{11}$', str(ruc)):
-                    return {"error": "Formato de RUC inválido. Debe tener exactamente 11 dígitos numéricos"}, 400
-            
-            # Crear y guardar cliente
-            nuevo_cliente = cliente_schema.load(data)
-            db.session.add(nuevo_cliente)
-            db.session.commit()
-            
-            logger.info(f"Cliente creado: {nuevo_cliente.nombre}")
-            return cliente_schema.dump(nuevo_cliente), 201
+        # Validar que sea JSON
+        if not request.is_json:
+            return {"error": "Se esperaba contenido JSON"}, 400
             
-        except Exception as e:
-            logger.error(f"Error al crear cliente: {str(e)}")
-            db.session.rollback()
-            return {"error": "Error al procesar la solicitud"}, 500
+        data = request.get_json()
+        if not data:
+            return {"error": "Datos JSON vacíos o inválidos"}, 400
+
+        # Validar campos requeridos
+        if not data.get('nombre'):
+            return {"error": "El nombre del cliente es obligatorio"}, 400
+
+        # Validar teléfono si está presente
+        if telefono := data.get('telefono'):
+            if not _TELEFONO_LONGITUD_PATTERN.match(telefono):
+                return {"error": "Formato de teléfono inválido"}, 400
+
+        # Validar RUC si está presente
+        if ruc := data.get('ruc'):
+            if not _RUC_PATTERN.match(str(ruc)):
+                return {"error": "Formato de RUC inválido. Debe tener exactamente 11 dígitos numéricos"}, 400
+
+        # Crear y guardar cliente
+        nuevo_cliente = cliente_schema.load(data)
+        db.session.add(nuevo_cliente)
+        db.session.commit()
+
+        logger.info(f"Cliente creado: {nuevo_cliente.nombre}")
+        return cliente_schema.dump(nuevo_cliente), 201
+
 
     @jwt_required()
     @rol_requerido('admin', 'gerente', 'usuario')
     @handle_db_errors
     def put(self, cliente_id):
         """Actualiza cliente existente con validación parcial"""
-        try:
-            if not cliente_id:
-                return {"error": "Se requiere ID de cliente"}, 400
-                
-            cliente = Cliente.query.get_or_404(cliente_id)
-            
-            # Validar que sea JSON
-            if not request.is_json:
-                return {"error": "Se esperaba contenido JSON"}, 400
-                
-            data = request.get_json()
-            if not data:
-                return {"error": "Datos JSON vacíos o inválidos"}, 400
-            
-            # Validar teléfono si está presente
-            if telefono := data.get('telefono'):
-                if not re.match(r'^[\d\+\-\s()]{3,20}$', telefono):
-                    return {"error": "Formato de teléfono inválido"}, 400
-                    
-            # Validar RUC si está presente
-            if ruc := data.get('ruc'):
-                if not re.match(r'^\d{11}$', str(ruc)):
-                    return {"error": "Formato de RUC inválido. Debe tener exactamente 11 dígitos numéricos"}, 400
+        if not cliente_id:
+            return {"error": "Se requiere ID de cliente"}, 400
             
-            # Actualizar cliente
-            cliente_actualizado = cliente_schema.load(
-                data,
-                instance=cliente,
-                partial=True
-            )
-            
-            db.session.commit()
-            return cliente_schema.dump(cliente_actualizado), 200
+        cliente = Cliente.query.get_or_404(cliente_id)
+
+        # Validar que sea JSON
+        if not request.is_json:
+            return {"error": "Se esperaba contenido JSON"}, 400
             
-        except Exception as e:
-            logger.error(f"Error al actualizar cliente: {str(e)}")
-            db.session.rollback()
-            return {"error": "Error al procesar la solicitud"}, 500
+        data = request.get_json()
+        if not data:
+            return {"error": "Datos JSON vacíos o inválidos"}, 400
+
+        # Validar teléfono si está presente
+        if telefono := data.get('telefono'):
+            if not _TELEFONO_LONGITUD_PATTERN.match(telefono):
+                return {"error": "Formato de teléfono inválido"}, 400
+
+        # Validar RUC si está presente
+        if ruc := data.get('ruc'):
+            if not _RUC_PATTERN.match(str(ruc)):
+                return {"error": "Formato de RUC inválido. Debe tener exactamente 11 dígitos numéricos"}, 400
+
+        # Actualizar cliente
+        cliente_actualizado = cliente_schema.load(
+            data,
+            instance=cliente,
+            partial=True
+        )
+
+        db.session.commit()
+        return cliente_schema.dump(cliente_actualizado), 200
+
 
     @jwt_required()
     @rol_requerido('admin', 'gerente')
     @handle_db_errors
     def delete(self, cliente_id):
         """Elimina cliente solo si no tiene ventas asociadas"""
-        try:
-            if not cliente_id:
-                return {"error": "Se requiere ID de cliente"}, 400
-                
-            cliente = Cliente.query.get_or_404(cliente_id)
-            
-            # Verificar si tiene ventas asociadas
-            ventas = Venta.query.filter_by(cliente_id=cliente_id).count()
-            if ventas > 0:
-                return {
-                    "error": "No se puede eliminar cliente con historial de ventas",
-                    "ventas_asociadas": ventas
-                }, 400
-                
-            # Eliminar cliente
-            nombre_cliente = cliente.nombre  # Guardar para el log
-            db.session.delete(cliente)
-            db.session.commit()
-            
-            logger.info(f"Cliente eliminado: {cliente_id} - {nombre_cliente}")
-            return {"message": "Cliente eliminado exitosamente"}, 200
+        if not cliente_id:
+            return {"error": "Se requiere ID de cliente"}, 400
             
-        except Exception as e:
-            logger.error(f"Error al eliminar cliente: {str(e)}")
-            db.session.rollback()
-            return {"error": "Error al procesar la solicitud"}, 500
+        cliente = Cliente.query.get_or_404(cliente_id)
+
+        # Verificar si tiene ventas asociadas: EXISTS se detiene en la primera fila;
+        # el conteo solo se calcula cuando hay que rechazar la eliminación
+        ventas_cliente = Venta.query.filter_by(cliente_id=cliente_id)
+        if db.session.query(ventas_cliente.exists()).scalar():
+            return {
+                "error": "No se puede eliminar cliente con historial de ventas",
+                "ventas_asociadas": ventas_cliente.count()
+            }, 400
+            
+        # Eliminar cliente
+        nombre_cliente = cliente.nombre  # Guardar para el log
+        db.session.delete(cliente)
+        db.session.commit()
+
+        logger.info(f"Cliente eliminado: {cliente_id} - {nombre_cliente}")
+        return {"message": "Cliente eliminado exitosamente"}, 200
+
+
+
+def _filas_export_clientes(ciudad):
+    """Filas de /clientes/exportar como tuplas, en el orden de COLUMNAS_EXPORT_CLIENTES."""
+    # Solo las columnas del reporte como tuplas (sin instancias ORM), con el saldo
+    # calculado en la misma consulta, aplicando filtro si se proporciona
+    query = db.session.query(
+        Cliente.id, Cliente.nombre, Cliente.telefono, Cliente.direccion, Cliente.ciudad,
+        Cliente.saldo_pendiente.label('saldo_pendiente'),
+        Cliente.ultima_fecha_compra, Cliente.frecuencia_compra_dias
+    )
+    if ciudad:
+        query = query.filter(Cliente.ciudad == ciudad)
+
+    for c in query.yield_per(1000):
+        yield (
+            c.id, c.nombre, c.telefono, c.direccion, c.ciudad,
+            float(c.saldo_pendiente or 0),
+            c.ultima_fecha_compra.strftime('%Y-%m-%d') if c.ultima_fecha_compra else None,
+            c.frecuencia_compra_dias
+        )
+
+def _generar_excel_clientes(ciudad):
+    """
+    Genera el .xlsx de /clientes/exportar en un archivo temporal (en memoria hasta
+    16 MB, en disco si lo supera) posicionado al inicio. Devuelve None si no hay clientes.
+    """
+    # Leer la primera fila antes de armar el libro: sin resultados no se crea nada
+    filas = _filas_export_clientes(ciudad)
+    primera = next(filas, None)
+    if primera is None:
+        return None
+
+    # Escribir las filas a medida que llegan de la consulta
+    return _escribir_xlsx('Clientes', COLUMNAS_EXPORT_CLIENTES, itertools.chain((primera,), filas), columnas_moneda=(5,))
+
+def _stream_csv(columnas, primera, filas):
+    """
+    Genera el CSV por bloques a medida que llegan las filas: el cliente recibe los
+    primeros bytes sin esperar a que se lea toda la consulta. El BOM inicial permite
+    que Excel detecte UTF-8 (tildes y ñ).
+    """
+    buffer = io.StringIO()
+    buffer.write('\ufeff')
+    writer = csv.writer(buffer)
+    writer.writerow(columnas)
+    writer.writerow(primera)
+    for i, fila in enumerate(filas, start=1):
+        writer.writerow(fila)
+        if i % EXPORT_LOTE_CSV == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def _escribir_xlsx(hoja, columnas, filas, columnas_moneda=()):
+    """
+    Escribe `filas` (iterable de tuplas) con xlsxwriter en modo constant_memory: cada
+    fila se vuelca al llegar, sin mantener todas las celdas en memoria (las filas se
+    escriben completas y en orden, como exige ese modo). `columnas_moneda` son índices
+    de columna con formato '#,##0.00'. Devuelve un archivo temporal (en memoria hasta
+    16 MB, en disco si lo supera) posicionado al inicio; send_file lo envía por bloques
+    y lo cierra al terminar.
+    """
+    output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES)
+    wb = xlsxwriter.Workbook(output, {'constant_memory': True})
+    ws = wb.add_worksheet(hoja)
+
+    # Formatos por columna: las celdas del cuerpo se escriben sin formato propio
+    formato_moneda = wb.add_format(_FORMATO_MONEDA)
+    for col in columnas_moneda:
+        ws.set_column(col, col, 14, formato_moneda)
+    ws.write_row(0, 0, columnas, wb.add_format(_FORMATO_ENCABEZADO))
 
+    for fila_idx, fila in enumerate(filas, start=1):
+        ws.write_row(fila_idx, 0, fila)
+
+    wb.close()
+    output.seek(0)
+    return output
+
+@functools.lru_cache(maxsize=4096)
+def _fecha_proxima_compra(ultima_compra, frecuencia_dias):
+    """
+    'YYYY-MM-DD' de la próxima compra estimada. Se memoiza por (día, frecuencia):
+    en una exportación muchos clientes comparten ambos valores.
+    """
+    return (ultima_compra + timedelta(days=frecuencia_dias)).strftime('%Y-%m-%d')
 
 class ClienteExportResource(Resource):
     @jwt_required()
@@ -200,63 +454,65 @@ class ClienteExportResource(Resource):
     def get(self):
         """
         Exporta todos los clientes a un archivo Excel, opcionalmente filtrado por ciudad.
+        Con formato=csv las filas se envían en streaming a medida que se leen.
         """
         parser = reqparse.RequestParser()
         parser.add_argument('ciudad', type=str, location='args', help='Filtra clientes por ciudad')
+        parser.add_argument('formato', type=str, location='args', default='xlsx', choices=('xlsx', 'csv'))
         args = parser.parse_args()
         ciudad = args.get('ciudad')
 
-        try:
-            # 1. Obtener clientes, aplicando filtro si se proporciona
-            if ciudad:
-                clientes = Cliente.query.filter_by(ciudad=ciudad).all()
-            else:
-                clientes = Cliente.query.all()
-            if not clientes:
+        if args['formato'] == 'csv':
+            filas = _filas_export_clientes(ciudad)
+            primera = next(filas, None)
+            if primera is None:
                 return {"message": "No hay clientes para exportar"}, 404
-
-            # 2. Serializar los datos con el esquema
-            cliente_schema = ClienteSchema(many=True)
-            data = cliente_schema.dump(clientes)
-
-            # 3. Crear un DataFrame de pandas
-            df = pd.DataFrame(data)
-
-            # 4. Optimizar el DataFrame para el reporte
-            columnas_deseadas = {
-                'id': 'ID',
-                'nombre': 'Nombre',
-                'telefono': 'Teléfono',
-                'direccion': 'Dirección',
-                'ciudad': 'Ciudad',
-                'saldo_pendiente': 'Saldo Pendiente',
-                'ultima_fecha_compra': 'Última Compra',
-                'frecuencia_compra_dias': 'Frecuencia de Compra'
-            }
-            
-            # Filtrar y renombrar columnas
-            df_optimizado = df[list(columnas_deseadas.keys())]
-            df_optimizado = df_optimizado.rename(columns=columnas_deseadas)
-
-
-            # 5. Crear un archivo Excel en memoria
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df_optimizado.to_excel(writer, index=False, sheet_name='Clientes')
-            
-            output.seek(0)
-
-            # 5. Enviar el archivo como respuesta
-            return send_file(
-                output,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                as_attachment=True,
-                download_name='clientes.xlsx'
+            return Response(
+                stream_with_context(_stream_csv(COLUMNAS_EXPORT_CLIENTES, primera, filas)),
+                mimetype='text/csv',
+                headers={'Content-Disposition': 'attachment; filename=clientes.csv'}
             )
 
-        except Exception as e:
-            logger.error(f"Error al exportar clientes: {str(e)}")
-            return {"error": "Error interno al generar el archivo Excel"}, 500
+        # 0. Archivo ya generado con los mismos datos: servirlo desde Redis
+        cache_key = None
+        version = version_cache(_VERSION_EXPORT_CLIENTES)
+        if version is not None:
+            cache_key = f"cliente_export:{version}:{ciudad or 'ALL'}"
+            try:
+                contenido = redis_client.get(cache_key)
+            except redis.RedisError as e:
+                logger.warning(f"No se pudo leer la caché de exportación de clientes: {e}")
+                contenido = None
+            if contenido is not None:
+                return self._enviar_excel(io.BytesIO(contenido))
+
+        # 1-3. Generar el archivo (None si el filtro no devuelve clientes)
+        output = _generar_excel_clientes(ciudad)
+        if output is None:
+            return {"message": "No hay clientes para exportar"}, 404
+
+        # 4. Guardar en caché si el archivo es razonablemente pequeño (_generar_excel_clientes
+        # lo devuelve rebobinado: el tamaño se mide desde el final)
+        tamano = output.seek(0, io.SEEK_END)
+        output.seek(0)
+        if cache_key is not None and tamano <= EXPORT_CACHE_MAX_BYTES:
+            try:
+                redis_client.setex(cache_key, EXPORT_CACHE_TTL, output.read())
+            except redis.RedisError as e:
+                logger.warning(f"No se pudo guardar la caché de exportación de clientes: {e}")
+        output.seek(0)
+
+        # 5. Enviar el archivo como respuesta
+        return self._enviar_excel(output)
+
+    @staticmethod
+    def _enviar_excel(archivo):
+        return send_file(
+            archivo,
+            mimetype=XLSX_MIMETYPE,
+            as_attachment=True,
+            download_name='clientes.xlsx'
+        )
 
 class ClienteProyeccionResource(Resource):
     """Recursos de proyección para clientes.
@@ -277,67 +533,99 @@ class ClienteProyeccionResource(Resource):
             return self._get_lista_proyecciones()
 
     def _get_detalle_cliente(self, cliente_id):
-        try:
-            codigo = request.args.get('codigo')
-            if codigo:
-                try:
-                    cliente_id = int(codigo)
-                except ValueError:
-                    return {"error": "codigo inválido"}, 400
-            cliente = Cliente.query.options(
-                orm.selectinload(Cliente.ventas).selectinload(Venta.detalles)
-            ).get_or_404(cliente_id)
-            ventas = sorted(cliente.ventas, key=lambda x: x.fecha, reverse=True)
-            historial = []
-            for v in ventas:
-                detalles = [{
-                    'presentacion': d.presentacion.nombre if d.presentacion else None,
-                    'cantidad': int(d.cantidad),
-                    'precio_unitario': float(d.precio_unitario)
-                } for d in (v.detalles or [])]
-                historial.append({
-                    'id': v.id,
-                    'fecha': v.fecha.isoformat() if v.fecha else None,
-                    'total': float(v.total),
-                    'estado_pago': v.estado_pago,
-                    'detalles': detalles
-                })
-            productos_counter = {}
-            for v in ventas:
-                for d in (v.detalles or []):
-                    nombre = d.presentacion.nombre if d.presentacion else 'N/A'
-                    productos_counter[nombre] = productos_counter.get(nombre, 0) + int(d.cantidad)
-            productos_mas = sorted(productos_counter.items(), key=lambda x: x[1], reverse=True)[:5]
-            monto_total_comprado = float(sum(v.total for v in ventas)) if ventas else 0.0
-            promedio_compra = round(monto_total_comprado / len(ventas), 2) if ventas else 0.0
-            estadisticas = {
-                'total_ventas': len(ventas),
-                'monto_total_comprado': monto_total_comprado,
-                'promedio_compra': promedio_compra,
-                'frecuencia_compra_dias': cliente.frecuencia_compra_dias or 0,
-                'productos_mas_comprados': [{'nombre': n, 'cantidad': c} for n, c in productos_mas]
-            }
-            vp = db.session.query(VistaClienteProyeccion).filter(VistaClienteProyeccion.id == cliente.id).first()
-            proyeccion = {
-                'fecha_estimada': vp.proxima_compra_estimada.isoformat() if vp and vp.proxima_compra_estimada else None,
-                'productos_probables': [{'nombre': n, 'cantidad': c} for n, c in productos_mas],
-                'valor_estimado': float(vp.promedio_compra or 0) if vp and vp.promedio_compra is not None else promedio_compra
-            }
-            return {
-                'codigo': str(cliente.id),
-                'historial_ventas': historial,
-                'estadisticas': estadisticas,
-                'proyeccion_detallada': proyeccion
-            }, 200
-        except Exception as e:
-            logger.error(f"Error al obtener detalle del cliente {cliente_id}: {str(e)}")
-            return {"error": "Error al procesar la solicitud de detalle"}, 500
+        codigo = request.args.get('codigo')
+        if codigo:
+            try:
+                cliente_id = int(codigo)
+            except ValueError:
+                return {"error": "codigo inválido"}, 400
+        # Solo las columnas que se usan; load_only(raiseload=True) hace fallar el
+        # acceso a cualquier otra en lugar de cargarla con un SELECT adicional
+        cliente = Cliente.query.options(
+            orm.load_only(Cliente.frecuencia_compra_dias, raiseload=True),
+            orm.raiseload('*')
+        ).get_or_404(cliente_id)
+        # Ventas ya ordenadas por Postgres (idx_ventas_cliente_fecha), con detalles y
+        # presentaciones en bloque. raiseload('*') en cada nivel: cualquier otra
+        # relación (p. ej. Venta.pagos) falla en vez de cargarse por fila
+        ventas = Venta.query.filter(Venta.cliente_id == cliente.id).options(
+            orm.load_only(Venta.fecha, Venta.total, Venta.estado_pago, raiseload=True),
+            orm.selectinload(Venta.detalles).options(
+                orm.load_only(VentaDetalle.cantidad, VentaDetalle.precio_unitario, raiseload=True),
+                orm.joinedload(VentaDetalle.presentacion).raiseload('*'),
+                orm.raiseload('*')
+            ),
+            orm.raiseload('*')
+        ).order_by(desc(Venta.fecha)).all()
+        historial = []
+        for v in ventas:
+            detalles = [{
+                'presentacion': d.presentacion.nombre if d.presentacion else None,
+                'cantidad': int(d.cantidad),
+                'precio_unitario': float(d.precio_unitario)
+            } for d in (v.detalles or [])]
+            historial.append({
+                'id': v.id,
+                'fecha': v.fecha.isoformat() if v.fecha else None,
+                'total': float(v.total),
+                'estado_pago': v.estado_pago,
+                'detalles': detalles
+            })
+        productos_counter = Counter()
+        for v in ventas:
+            for d in (v.detalles or []):
+                productos_counter[d.presentacion.nombre if d.presentacion else 'N/A'] += int(d.cantidad)
+        productos_mas = productos_counter.most_common(5)
+        # Conteo y SUM(total) en Postgres (un solo Numeric a convertir) junto con los
+        # datos de la vista: una sola consulta, sin sumar Decimals en Python
+        def vista(col):
+            return select(col).where(VistaClienteProyeccion.id == cliente.id).scalar_subquery()
+
+        resumen = db.session.query(
+            func.count(Venta.id).label('total_ventas'),
+            func.sum(Venta.total).label('monto_total'),
+            vista(VistaClienteProyeccion.proxima_compra_estimada).label('proxima_compra_estimada'),
+            vista(VistaClienteProyeccion.promedio_compra).label('promedio_estimado')
+        ).filter(Venta.cliente_id == cliente.id).one()
+        monto_total_comprado = float(resumen.monto_total or 0)
+        promedio_compra = round(monto_total_comprado / resumen.total_ventas, 2) if resumen.total_ventas else 0.0
+        estadisticas = {
+            'total_ventas': resumen.total_ventas,
+            'monto_total_comprado': monto_total_comprado,
+            'promedio_compra': promedio_compra,
+            'frecuencia_compra_dias': cliente.frecuencia_compra_dias or 0,
+            'productos_mas_comprados': [{'nombre': n, 'cantidad': c} for n, c in productos_mas]
+        }
+        proyeccion = {
+            'fecha_estimada': resumen.proxima_compra_estimada.isoformat() if resumen.proxima_compra_estimada else None,
+            'productos_probables': [{'nombre': n, 'cantidad': c} for n, c in productos_mas],
+            'valor_estimado': float(resumen.promedio_estimado) if resumen.promedio_estimado is not None else promedio_compra
+        }
+        return {
+            'codigo': str(cliente.id),
+            'historial_ventas': historial,
+            'estadisticas': estadisticas,
+            'proyeccion_detallada': proyeccion
+        }, 200
 
     def _get_lista_proyecciones(self):
         """Lista de clientes con proyecciones usando la vista materializada en la base de datos."""
         try:
             args = request.args
-            query = db.session.query(VistaClienteProyeccion)
+            # Solo las columnas que se devuelven: Postgres no calcula las demás columnas
+            # de la vista (saldos y agregados de ventas por cliente). raiseload: leer una
+            # columna o relación no cargada falla en vez de lanzar un SELECT por fila.
+            # Filtro por fecha, orden y cursor usan la misma columna: proxima_compra_date,
+            # generada e indexada en clientes (la fecha de la vista solo se muestra)
+            fecha_col = Cliente.proxima_compra_date
+            query = db.session.query(VistaClienteProyeccion, fecha_col).join(
+                Cliente, Cliente.id == VistaClienteProyeccion.id
+            ).options(orm.load_only(
+                VistaClienteProyeccion.nombre, VistaClienteProyeccion.telefono,
+                VistaClienteProyeccion.ciudad, VistaClienteProyeccion.ultima_fecha_compra,
+                VistaClienteProyeccion.proxima_compra_estimada, VistaClienteProyeccion.estado_proyeccion,
+                raiseload=True
+            ), orm.raiseload('*'))
             search_term = args.get('search') or args.get('nombre')
             if search_term:
                 query = query.filter(VistaClienteProyeccion.nombre.ilike(f'%{search_term}%'))
@@ -347,20 +635,31 @@ class ClienteProyeccionResource(Resource):
                     query = query.filter(VistaClienteProyeccion.ciudad.ilike(f'%{ciudad}%'))
             # Incluir TODOS los clientes; el orden enviará sin proyección al final
             single_date, start_date, end_date = self._parse_date_args(args)
-            if single_date or start_date or end_date:
-                date_col = cast(VistaClienteProyeccion.proxima_compra_estimada, Date)
-                if single_date:
-                    query = query.filter(date_col == single_date)
-                else:
-                    if start_date:
-                        query = query.filter(date_col >= start_date)
-                    if end_date:
-                        query = query.filter(date_col <= end_date)
-            query = query.order_by(asc(VistaClienteProyeccion.proxima_compra_estimada).nulls_last())
+            # En lugar de castear la fecha calculada por la vista (que obliga a recorrerla entera)
+            if single_date:
+                query = query.filter(fecha_col == single_date)
+            else:
+                if start_date:
+                    query = query.filter(fecha_col >= start_date)
+                if end_date:
+                    query = query.filter(fecha_col <= end_date)
+            # id como desempate: orden determinista, necesario para el cursor keyset
+            query = query.order_by(asc(fecha_col).nulls_last(), asc(VistaClienteProyeccion.id))
             page, per_page = validate_pagination_params()
-            paginated_results = query.paginate(page=page, per_page=per_page, error_out=False)
+            if args.get('cursor'):
+                items, pagination = self._paginar_keyset(query, args['cursor'], per_page)
+            else:
+                paginated_results = query.paginate(page=page, per_page=per_page, error_out=False)
+                items = paginated_results.items
+                pagination = {
+                    'total': paginated_results.total,
+                    'page': paginated_results.page,
+                    'per_page': paginated_results.per_page,
+                    'pages': paginated_results.pages,
+                    'next_cursor': self._cursor_proyeccion(items[-1]) if paginated_results.has_next else None
+                }
             clientes_con_proyeccion = []
-            for vp in paginated_results.items:
+            for vp, _ in items:
                 cliente_data = {
                     'codigo': str(vp.id),
                     'nombre': vp.nombre,
@@ -373,20 +672,47 @@ class ClienteProyeccionResource(Resource):
                 clientes_con_proyeccion.append(cliente_data)
             return {
                 'data': clientes_con_proyeccion,
-                'pagination': {
-                    'total': paginated_results.total,
-                    'page': paginated_results.page,
-                    'per_page': paginated_results.per_page,
-                    'pages': paginated_results.pages
-                },
+                'pagination': pagination,
                 'resumen': self._generar_resumen_global(clientes_con_proyeccion)
             }, 200
         except ValueError as ve:
+            # Fechas o cursor mal formados
             return {'error': str(ve)}, 400
-        except Exception as e:
-            logger.error(f"Error al obtener lista de proyecciones: {str(e)}")
-            db.session.rollback()
-            return {"error": "Error al procesar la lista de proyecciones"}, 500
+
+    @staticmethod
+    def _cursor_proyeccion(fila):
+        """Cursor keyset a partir de la última fila (vista, proxima_compra_date): (fecha, id)."""
+        vp, fecha = fila
+        return encode_cursor((fecha.isoformat() if fecha else None, vp.id))
+
+    def _paginar_keyset(self, query, cursor, per_page):
+        """
+        Página siguiente a `cursor` con WHERE sobre (proxima_compra_date, id)
+        en lugar de OFFSET: el costo no crece con la profundidad de la página.
+        Respeta el orden ascendente con NULLS LAST de la lista.
+        """
+        ultima_fecha, ultimo_id = decode_cursor(cursor, 2)
+        if not isinstance(ultimo_id, int):
+            raise ValueError("Cursor de paginación inválido")
+        fecha_col = Cliente.proxima_compra_date
+        if ultima_fecha is None:
+            # Ya se está en el tramo final de filas sin proyección
+            query = query.filter(fecha_col.is_(None), VistaClienteProyeccion.id > ultimo_id)
+        else:
+            ultima_fecha = date.fromisoformat(ultima_fecha)
+            query = query.filter(or_(
+                fecha_col > ultima_fecha,
+                and_(fecha_col == ultima_fecha, VistaClienteProyeccion.id > ultimo_id),
+                fecha_col.is_(None)
+            ))
+
+        # Una fila extra indica si hay página siguiente, sin COUNT(*)
+        filas = query.limit(per_page + 1).all()
+        items = filas[:per_page]
+        return items, {
+            'per_page': per_page,
+            'next_cursor': self._cursor_proyeccion(items[-1]) if len(filas) > per_page else None
+        }
 
     def _calcular_proyeccion_compra(self, cliente):
         """
@@ -481,106 +807,11 @@ class ClienteProyeccionResource(Resource):
         else:
             return 'baja'
     
-    def _calcular_estadisticas_cliente(self, cliente, ventas):
-        """
-        Calcula estadísticas detalladas del cliente
-        """
-        estadisticas = {
-            'total_ventas': len(ventas),
-            'monto_total_comprado': 0,
-            'saldo_pendiente': float(cliente.saldo_pendiente),
-            'promedio_compra': 0,
-            'ventas_por_estado': {
-                'pagado': 0,
-                'parcial': 0,
-                'pendiente': 0
-            },
-            'ultima_actividad': None,
-            'tendencia_compra': None
-        }
-        
-        if ventas:
-            # Montos
-            estadisticas['monto_total_comprado'] = float(sum(v.total for v in ventas))
-            estadisticas['promedio_compra'] = round(
-                estadisticas['monto_total_comprado'] / len(ventas), 2
-            )
-            estadisticas['ultima_actividad'] = ventas[0].fecha.isoformat()
-            
-            # Contar por estado
-            for venta in ventas:
-                estadisticas['ventas_por_estado'][venta.estado_pago] += 1
-            
-            # Análisis de tendencia (últimas 3 vs anteriores)
-            if len(ventas) >= 6:
-                ultimas_3 = sum(v.total for v in ventas[:3]) / 3
-                anteriores_3 = sum(v.total for v in ventas[3:6]) / 3
-                
-                diferencia_porcentual = ((ultimas_3 - anteriores_3) / anteriores_3) * 100
-                
-                if diferencia_porcentual > 10:
-                    estadisticas['tendencia_compra'] = 'creciente'
-                elif diferencia_porcentual < -10:
-                    estadisticas['tendencia_compra'] = 'decreciente'
-                else:
-                    estadisticas['tendencia_compra'] = 'estable'
-        
-        return estadisticas
-    
-    def _calcular_prioridad(self, cliente, proyeccion, total_ventas, monto_total):
-        """
-        Calcula prioridad del cliente para seguimiento
-        """
-        puntos = 0
-        
-        # Retraso (máx 40 puntos)
-        if proyeccion and proyeccion.get('disponible'):
-            dias_retraso = proyeccion.get('dias_retraso', 0)
-            if dias_retraso > 0:
-                puntos += min(40, dias_retraso * 2)
-        
-        # Valor del cliente (máx 30 puntos)
-        if monto_total > 10000:
-            puntos += 30
-        elif monto_total > 5000:
-            puntos += 20
-        elif monto_total > 1000:
-            puntos += 10
-        
-        # Frecuencia de compra (máx 20 puntos)
-        if total_ventas > 20:
-            puntos += 20
-        elif total_ventas > 10:
-            puntos += 15
-        elif total_ventas > 5:
-            puntos += 10
-        
-        # Saldo pendiente (máx 10 puntos)
-        saldo = float(cliente.saldo_pendiente)
-        if saldo > 1000:
-            puntos += 10
-        elif saldo > 500:
-            puntos += 5
-        
-        # Clasificar
-        if puntos >= 70:
-            return 'alta'
-        elif puntos >= 40:
-            return 'media'
-        else:
-            return 'baja'
-
     def _sanitize_text(self, value):
         """Sanitiza texto de entrada para filtros no estructurados (como ciudad)."""
         if not value:
             return None
-        return re.sub(r'[^\w\s\-áéíóúÁÉÍÓÚñÑ]', '', value)
-
-    def _param_bool(self, value):
-        """Convierte parámetros booleanos ("true"/"false") en bool."""
-        if value is None:
-            return False
-        return str(value).strip().lower() in {'true', '1', 'yes', 'y'}
+        return _CIUDAD_INVALIDOS_PATTERN.sub('', value)
 
     def _parse_date_value(self, value):
         """Parsea una fecha en múltiples formatos y retorna `date`.
@@ -617,35 +848,6 @@ class ClienteProyeccionResource(Resource):
 
         return single_date, start_date, end_date
 
-    def _apply_date_filters(self, query, cliente_date_col, ultima_venta_col, single_date, start_date, end_date, proxima_compra_col=None):
-        """Aplica filtros de fecha sobre columnas de última compra/venta.
-
-        Si se proporciona `proxima_compra_col`, se filtra por proyección; de lo contrario
-        aplica sobre coalesce(ultima_venta, ultima_fecha_compra) para que clientes sin ventas
-        recientes usen su `ultima_fecha_compra`.
-        """
-        date_expr = proxima_compra_col if proxima_compra_col is not None else func.coalesce(ultima_venta_col, cliente_date_col)
-
-        if single_date:
-            query = query.filter(date_expr == single_date)
-        else:
-            if start_date:
-                query = query.filter(date_expr >= start_date)
-            if end_date:
-                query = query.filter(date_expr <= end_date)
-        return query
-
-    def _apply_order_strategy(self, query, order_by):
-        """Aplica la estrategia de ordenamiento según `order_by`."""
-        strategies = {
-            'ultima_compra': lambda q: q.order_by(desc(Cliente.ultima_fecha_compra)),
-            'saldo': lambda q: q.order_by(desc(Cliente.saldo_pendiente)),
-            'nombre': lambda q: q.order_by(asc(Cliente.nombre)),
-            'frecuencia': lambda q: q.order_by(asc(Cliente.frecuencia_compra_dias))
-        }
-        strategy = strategies.get(order_by, strategies['ultima_compra'])
-        return strategy(query)
-    
     def _generar_resumen_global(self, clientes):
         """
         Genera resumen ejecutivo de todos los clientes
@@ -690,91 +892,121 @@ class ClienteProyeccionExportResource(Resource):
         parser.add_argument('frecuencia_minima', type=int, location='args')
         args = parser.parse_args()
 
-        try:
-            # --- Subconsulta para agregar estadísticas de ventas ---
-            venta_stats = db.session.query(
-                Venta.cliente_id.label('cliente_id'),
-                func.count(Venta.id).label('total_ventas'),
-                func.sum(Venta.total).label('monto_total_comprado')
-            ).group_by(Venta.cliente_id).subquery()
-            
-            # --- Subconsulta para agregar estadísticas de pedidos ---
-            pedido_stats = db.session.query(
-                Pedido.cliente_id.label('cliente_id'),
-                func.count(Pedido.id).label('total_pedidos')
-            ).group_by(Pedido.cliente_id).subquery()
-
-            # --- Construir la consulta principal ---
-            query = db.session.query(
-                Cliente,
-                func.coalesce(venta_stats.c.total_ventas, 0).label('total_ventas'),
-                func.coalesce(venta_stats.c.monto_total_comprado, 0).label('monto_total_comprado'),
-                func.coalesce(pedido_stats.c.total_pedidos, 0).label('total_pedidos')
-            ).outerjoin(
-                venta_stats, Cliente.id == venta_stats.c.cliente_id
-            ).outerjoin(
-                pedido_stats, Cliente.id == pedido_stats.c.cliente_id
-            )
-            
-            # Aplicar filtros
-            if args['ciudad']:
-                query = query.filter(Cliente.ciudad.ilike(f"%{args['ciudad']}%"))
-            if args['saldo_minimo']:
-                query = query.filter(Cliente.saldo_pendiente >= args['saldo_minimo'])
-            if args['frecuencia_minima']:
-                query = query.filter(Cliente.frecuencia_compra_dias >= args['frecuencia_minima'])
-            
-            # Solo clientes con frecuencia de compra calculada
-            query = query.filter(Cliente.frecuencia_compra_dias.isnot(None))
-            
-            resultados = query.order_by(desc(Cliente.ultima_fecha_compra)).all()
-            
-            if not resultados:
-                return {"message": "No hay clientes con proyecciones para exportar con los filtros seleccionados"}, 404
-
-            # --- Construir los datos para el Excel ---
-            data_para_excel = []
-            for result in resultados:
-                cliente = result.Cliente
-                monto_total = float(result.monto_total_comprado)
-                total_ventas = result.total_ventas
-                
-                # Calcular proyección de próxima compra
-                proxima_compra = None
-                if cliente.ultima_fecha_compra and cliente.frecuencia_compra_dias and cliente.frecuencia_compra_dias > 0:
-                    proxima_compra = (cliente.ultima_fecha_compra + timedelta(days=cliente.frecuencia_compra_dias)).strftime('%Y-%m-%d')
-                
-                data_para_excel.append({
-                    'ID': cliente.id,
-                    'Nombre': cliente.nombre,
-                    'Teléfono': cliente.telefono or 'N/A',
-                    'Dirección': cliente.direccion or 'N/A',
-                    'Ciudad': cliente.ciudad or 'N/A',
-                    'Saldo Pendiente': float(cliente.saldo_pendiente),
-                    'Última Compra': cliente.ultima_fecha_compra.strftime('%Y-%m-%d') if cliente.ultima_fecha_compra else 'N/A',
-                    'Frecuencia Compra (días)': cliente.frecuencia_compra_dias or 0,
-                    'Próxima Compra Estimada': proxima_compra or 'N/A',
-                    'Total Ventas': total_ventas,
-                    'Monto Total Comprado': monto_total,
-                    'Promedio por Compra': monto_total / total_ventas if total_ventas > 0 else 0,
-                    'Total Pedidos': result.total_pedidos
-                })
-
-            df = pd.DataFrame(data_para_excel)
-
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False, sheet_name='Clientes Proyecciones')
-            
-            output.seek(0)
+        output = self._generar_excel(args['ciudad'], args['saldo_minimo'], args['frecuencia_minima'])
+        if output is None:
+            return {"message": "No hay clientes con proyecciones para exportar con los filtros seleccionados"}, 404
+
+        return send_file(
+            output,
+            mimetype=XLSX_MIMETYPE,
+            as_attachment=True,
+            download_name=f'clientes_proyecciones_{datetime.now().strftime("%Y%m%d")}.xlsx'
+        )
+
+    @classmethod
+    def _generar_excel(cls, ciudad, saldo_minimo, frecuencia_minima):
+        """Archivo .xlsx de proyecciones con los filtros dados, o None si no hay clientes."""
+        # --- Estadísticas por cliente como subconsultas correlacionadas ---
+        # Postgres las evalúa solo para los clientes que pasan los filtros (por índice
+        # sobre cliente_id), en lugar de agrupar ventas y pedidos completos
+        total_ventas = select(func.count(Venta.id)).where(
+            Venta.cliente_id == Cliente.id
+        ).correlate(Cliente).scalar_subquery()
+        monto_total = select(func.coalesce(func.sum(Venta.total), 0)).where(
+            Venta.cliente_id == Cliente.id
+        ).correlate(Cliente).scalar_subquery()
+        total_pedidos = select(func.count(Pedido.id)).where(
+            Pedido.cliente_id == Cliente.id
+        ).correlate(Cliente).scalar_subquery()
+
+        # --- Construir la consulta principal (solo las columnas del reporte) ---
+        query = db.session.query(
+            Cliente.id, Cliente.nombre, Cliente.telefono, Cliente.direccion, Cliente.ciudad,
+            Cliente.ultima_fecha_compra, Cliente.frecuencia_compra_dias,
+            total_ventas.label('total_ventas'),
+            monto_total.label('monto_total_comprado'),
+            total_pedidos.label('total_pedidos'),
+            # Saldo en la misma consulta; leerlo del objeto haría una consulta por cliente
+            Cliente.saldo_pendiente.label('saldo_pendiente')
+        )
+
+        # Aplicar filtros
+        if ciudad:
+            query = query.filter(Cliente.ciudad.ilike(f"%{ciudad}%"))
+        if saldo_minimo:
+            query = query.filter(Cliente.saldo_pendiente >= saldo_minimo)
+        if frecuencia_minima:
+            query = query.filter(Cliente.frecuencia_compra_dias >= frecuencia_minima)
+
+        # Solo clientes con frecuencia de compra calculada
+        query = query.filter(Cliente.frecuencia_compra_dias.isnot(None))
+
+        # Lotes keyset: cada lote es una consulta corta con LIMIT, sin cursor abierto
+        # durante toda la generación del libro ni OFFSET; las filas van directo al libro
+        filas = cls._lotes_keyset(query)
+        primera = next(filas, None)
+        if primera is None:
+            return None
 
-            return send_file(
-                output,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                as_attachment=True,
-                download_name=f'clientes_proyecciones_{datetime.now().strftime("%Y%m%d")}.xlsx'
-            )
+        return _escribir_xlsx('Clientes Proyecciones', COLUMNAS_EXPORT_PROYECCIONES, (
+            cls._fila_excel(r) for r in itertools.chain((primera,), filas)
+        ), columnas_moneda=(5, 10, 11))
 
-        except Exception as e:
-            logger.error(f"Error al exportar clientes con proyecciones: {str(e)}")
-            return {"error": "Error interno al generar el archivo Excel"}, 500
\ No newline at end of file
+    @staticmethod
+    def _lotes_keyset(query, tamano=EXPORT_LOTE_FILAS):
+        """
+        Recorre `query` por lotes de `tamano` filas en orden de última compra
+        descendente (sin última compra primero, como NULLS FIRST en Postgres),
+        continuando cada lote desde la última fila del anterior.
+        """
+        fecha, cliente_id = Cliente.ultima_fecha_compra, Cliente.id
+
+        # Tramo 1: clientes sin última compra, por id
+        ultimo_id = None
+        while True:
+            lote = query.filter(fecha.is_(None))
+            if ultimo_id is not None:
+                lote = lote.filter(cliente_id < ultimo_id)
+            lote = lote.order_by(cliente_id.desc()).limit(tamano).all()
+            yield from lote
+            if len(lote) < tamano:
+                break
+            ultimo_id = lote[-1].id
+
+        # Tramo 2: por (última compra, id), aprovechando ix_cliente_proy
+        ultimo = None
+        while True:
+            lote = query.filter(fecha.isnot(None))
+            if ultimo is not None:
+                lote = lote.filter(tuple_(fecha, cliente_id) < ultimo)
+            lote = lote.order_by(fecha.desc(), cliente_id.desc()).limit(tamano).all()
+            yield from lote
+            if len(lote) < tamano:
+                break
+            ultimo = (lote[-1].ultima_fecha_compra, lote[-1].id)
+
+    @staticmethod
+    def _fila_excel(result):
+        monto_total = float(result.monto_total_comprado)
+        total_ventas = result.total_ventas
+
+        # Calcular proyección de próxima compra
+        proxima_compra = None
+        if result.ultima_fecha_compra and result.frecuencia_compra_dias and result.frecuencia_compra_dias > 0:
+            proxima_compra = _fecha_proxima_compra(result.ultima_fecha_compra.date(), result.frecuencia_compra_dias)
+
+        return (
+            result.id,
+            result.nombre,
+            result.telefono or 'N/A',
+            result.direccion or 'N/A',
+            result.ciudad or 'N/A',
+            float(result.saldo_pendiente or 0),
+            result.ultima_fecha_compra.strftime('%Y-%m-%d') if result.ultima_fecha_compra else 'N/A',
+            result.frecuencia_compra_dias or 0,
+            proxima_compra or 'N/A',
+            total_ventas,
+            monto_total,
+            monto_total / total_ventas if total_ventas > 0 else 0,
+            result.total_pedidos
+        )
@@ -1,17 +1,25 @@
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required, get_jwt
 from flask import request
-from models import Venta, Pedido, Inventario, Cliente, PresentacionProducto, Almacen, Lote, Pago
-from extensions import db
-from common import handle_db_errors, rol_requerido
+from models import Venta, Pago
+from extensions import redis_client
+from common import handle_db_errors, rol_requerido, versionar_cache, version_cache
 from datetime import datetime, timezone, timedelta
-from sqlalchemy import func, case
-from sqlalchemy.orm import subqueryload, joinedload
+from sqlalchemy.orm import selectinload, joinedload, lazyload
 from decimal import Decimal
 import logging
+import orjson
+import redis
 
 logger = logging.getLogger(__name__)
 
+# La app móvil consulta el dashboard con frecuencia; la respuesta se guarda en Redis
+# por alcance (todos los almacenes o uno) y se descarta al confirmar cambios en
+# ventas o pagos. El TTL acota el retraso ante escrituras que no pasan por la sesión.
+DASHBOARD_CACHE_TTL = 60
+_VERSION_DASHBOARD = 'dashboard:version'
+versionar_cache(_VERSION_DASHBOARD, Venta, Pago)
+
 class DashboardResource(Resource):
     @jwt_required()
     @rol_requerido('admin', 'gerente', 'usuario')
@@ -19,7 +27,7 @@ class DashboardResource(Resource):
     def get(self):
         """
         Endpoint consolidado para alertas del dashboard de la app móvil.
-        Agrega datos de inventario bajo, lotes bajos y clientes con saldo pendiente.
+        Devuelve los clientes con saldo pendiente y el total de la deuda.
         Las alertas NO usan filtro de fecha.
         """
         claims = get_jwt()
@@ -27,38 +35,16 @@ class DashboardResource(Resource):
         user_almacen_id = claims.get('almacen_id')
         is_admin_or_gerente = user_rol in ['admin', 'gerente']
 
-        # Inventario con stock bajo (SIN filtro de fecha)
-        inventario_query = db.session.query(
-            Inventario.presentacion_id,
-            PresentacionProducto.nombre.label('presentacion_nombre'),
-            Inventario.cantidad,
-            Inventario.stock_minimo,
-            Inventario.almacen_id,
-            Almacen.nombre.label('almacen_nombre')
-        ).join(PresentacionProducto, Inventario.presentacion_id == PresentacionProducto.id)\
-         .join(Almacen, Inventario.almacen_id == Almacen.id)\
-         .filter(Inventario.cantidad <= Inventario.stock_minimo) # Alerta de stock bajo
-
-        # Lotes con cantidad baja (SIN filtro de fecha)
-        # Ajusta el umbral (e.g., 500) según sea necesario
-        UMBRAL_LOTE_BAJO_KG = 500
-        lotes_query = db.session.query(
-            Lote.id.label('lote_id'),
-            Lote.descripcion.label('lote_descripcion'),
-            Lote.cantidad_disponible_kg,
-            Lote.producto_id, # Para posible referencia futura
-            # Si necesitas el nombre del producto, añade un join:
-            # .join(Producto, Lote.producto_id == Producto.id)
-            # y selecciona Producto.nombre
-        ).filter(Lote.cantidad_disponible_kg < UMBRAL_LOTE_BAJO_KG) # Alerta de lote bajo
-
         # --- NUEVA QUERY ÚNICA PARA CLIENTES CON SALDO PENDIENTE ---
         # 1. Obtener todas las ventas pendientes o parciales, cargando eficientemente
         #    el cliente y los pagos asociados para evitar el problema N+1.
+        #    Los pagos llegan con un IN sobre los ids de las ventas ya leídas; con
+        #    subqueryload Postgres volvía a ejecutar la consulta de ventas completa.
         ventas_pendientes_query = Venta.query\
             .options(
                 joinedload(Venta.cliente),  # Usamos joinedload para cargar el cliente
-                subqueryload(Venta.pagos)  # y subqueryload para los pagos
+                selectinload(Venta.pagos),  # y selectinload para los pagos
+                lazyload(Venta.detalles)  # los detalles no se muestran en el dashboard
             )\
             .filter(Venta.estado_pago.in_(['pendiente', 'parcial']))
 
@@ -67,39 +53,20 @@ class DashboardResource(Resource):
         if not is_admin_or_gerente:
             if not user_almacen_id:
                 return {"error": "Usuario sin almacén asignado"}, 403
-            # Aplicar filtro a las queries que tienen relación directa con almacén
-            inventario_query = inventario_query.filter(Inventario.almacen_id == user_almacen_id)
             ventas_pendientes_query = ventas_pendientes_query.filter(Venta.almacen_id == user_almacen_id)
-        
-        # La query de lotes (lotes_query) no se filtra por almacén aquí.
+
+        # Admin y gerente ven todos los almacenes: comparten una misma entrada en caché
+        clave_cache = self._clave_cache('todos' if is_admin_or_gerente else user_almacen_id)
+        if clave_cache:
+            try:
+                cacheada = redis_client.get(clave_cache)
+                if cacheada:
+                    return orjson.loads(cacheada), 200
+            except redis.RedisError as e:
+                logger.warning(f"No se pudo leer el dashboard en caché: {e}")
 
         # --- Ejecutar Queries y Formatear Resultados ---
         try:
-            # Alertas de stock bajo (siempre se calculan)
-            stock_bajo_items = inventario_query.order_by(Almacen.nombre, PresentacionProducto.nombre).all()
-            stock_bajo_data = [
-                {
-                    "presentacion_id": item.presentacion_id,
-                    "nombre": item.presentacion_nombre,
-                    "cantidad": float(item.cantidad),
-                    "stock_minimo": item.stock_minimo,
-                    "almacen_id": item.almacen_id,
-                    "almacen_nombre": item.almacen_nombre
-                } for item in stock_bajo_items
-            ]
-
-            # Alertas de lotes bajos (siempre se calculan)
-            lotes_bajos_items = lotes_query.order_by(Lote.cantidad_disponible_kg).all()
-            lotes_alerta_data = [
-                {
-                    "lote_id": item.lote_id,
-                    "descripcion": item.lote_descripcion,
-                    "cantidad_disponible_kg": float(item.cantidad_disponible_kg or 0),
-                    "producto_id": item.producto_id
-                    # Añadir más detalles si es necesario
-                } for item in lotes_bajos_items
-            ]
-
             # --- Procesar y Agrupar los resultados de la nueva query de ventas ---
             ventas_con_deuda = ventas_pendientes_query.order_by(Venta.fecha.asc()).all()
             clientes_con_saldo_map = {} # Usamos un mapa para agrupar por cliente_id
@@ -163,15 +130,27 @@ class DashboardResource(Resource):
             # --- Ensamblar Respuesta Final ---
             dashboard_data = {
                 # Ya no se incluye 'periodo', 'ventas_por_dia', 'pedidos_programados_por_dia'
-                # Removidas: "alertas_stock_bajo" y "alertas_lotes_bajos"
+                # Removidas: "alertas_stock_bajo" y "alertas_lotes_bajos" (ya no se consultan)
                 "clientes_con_saldo_pendiente": clientes_saldo_data,
                 "total_deuda_clientes": total_deuda_clientes
             }
 
+            if clave_cache:
+                try:
+                    redis_client.setex(clave_cache, DASHBOARD_CACHE_TTL, orjson.dumps(dashboard_data))
+                except redis.RedisError as e:
+                    logger.warning(f"No se pudo guardar el dashboard en caché: {e}")
+
             return dashboard_data, 200
 
         except Exception as e:
             import uuid
             error_id = uuid.uuid4().hex[:8]
             logger.exception(f"Error al ejecutar queries del dashboard de alertas [{error_id}]: {e}")
-            return {"error": "Error al obtener datos para el dashboard de alertas", "error_id": error_id}, 500
\ No newline at end of file
+            return {"error": "Error al obtener datos para el dashboard de alertas", "error_id": error_id}, 500
+
+    @staticmethod
+    def _clave_cache(alcance):
+        """Clave en Redis del dashboard para `alcance` bajo la versión vigente de los datos."""
+        version = version_cache(_VERSION_DASHBOARD)
+        return f"dashboard:{version}:{alcance}" if version is not None else None
@@ -182,44 +182,54 @@ class GastoExportResource(Resource):
             current_user_id = claims.get('sub')
             rol = claims.get('rol')
             
-            query = Gasto.query
+            # Solo las columnas del reporte como tuplas: almacén, usuario y lote llegan
+            # por outer join en la misma consulta, sin instancias ORM ni carga perezosa
+            query = Gasto.query.with_entities(
+                Gasto.id, Gasto.fecha, Gasto.monto, Gasto.categoria, Gasto.descripcion,
+                Almacen.nombre.label('almacen_nombre'),
+                Users.username.label('usuario_username'),
+                Lote.descripcion.label('lote_descripcion')
+            ).outerjoin(Almacen, Gasto.almacen_id == Almacen.id
+            ).outerjoin(Users, Gasto.usuario_id == Users.id
+            ).outerjoin(Lote, Gasto.lote_id == Lote.id)
             if rol != 'admin':
-                query = query.filter_by(usuario_id=current_user_id)
+                query = query.filter(Gasto.usuario_id == current_user_id)
             # ----------------------
 
-            # Filtros adicionales
+            # Filtros adicionales (con join, filter_by apuntaría a la última entidad unida)
             if categoria := request.args.get('categoria'):
-                query = query.filter_by(categoria=categoria)
+                query = query.filter(Gasto.categoria == categoria)
             if fecha_inicio := request.args.get('fecha_inicio'):
                 query = query.filter(Gasto.fecha >= fecha_inicio)
             if fecha_fin := request.args.get('fecha_fin'):
                 query = query.filter(Gasto.fecha <= fecha_fin)
             if usuario_id := request.args.get('usuario_id'):
-                query = query.filter_by(usuario_id=usuario_id)
+                query = query.filter(Gasto.usuario_id == usuario_id)
             if lote_id := request.args.get('lote_id'):
-                query = query.filter_by(lote_id=lote_id)
+                query = query.filter(Gasto.lote_id == lote_id)
             if almacen_id := request.args.get('almacen_id'):
-                query = query.filter_by(almacen_id=almacen_id)
-
-            gastos = query.order_by(desc(Gasto.fecha)).all()
-
-            if not gastos:
+                query = query.filter(Gasto.almacen_id == almacen_id)
+
+            filas = [
+                (
+                    g.id,
+                    g.fecha.strftime('%Y-%m-%d') if g.fecha else '',
+                    float(g.monto),
+                    g.categoria,
+                    g.descripcion,
+                    g.almacen_nombre or 'N/A',
+                    g.usuario_username or 'N/A',
+                    g.lote_descripcion or 'N/A'
+                )
+                for g in query.order_by(desc(Gasto.fecha)).yield_per(1000)
+            ]
+
+            if not filas:
                 return {"message": "No hay gastos para exportar"}, 404
 
-            data_para_excel = []
-            for gasto in gastos:
-                data_para_excel.append({
-                    'ID': gasto.id,
-                    'Fecha': gasto.fecha.strftime('%Y-%m-%d') if gasto.fecha else '',
-                    'Monto': float(gasto.monto),
-                    'Categoría': gasto.categoria,
-                    'Descripción': gasto.descripcion,
-                    'Almacén': gasto.almacen.nombre if gasto.almacen else 'N/A',
-                    'Usuario': gasto.usuario.username if gasto.usuario else 'N/A',
-                    'Lote': gasto.lote.descripcion if gasto.lote else 'N/A'
-                })
-
-            df = pd.DataFrame(data_para_excel)
+            df = pd.DataFrame(filas, columns=[
+                'ID', 'Fecha', 'Monto', 'Categoría', 'Descripción', 'Almacén', 'Usuario', 'Lote'
+            ])
 
             output = io.BytesIO()
             with pd.ExcelWriter(output, engine='openpyxl') as writer:
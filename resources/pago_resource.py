@@ -19,7 +19,7 @@ from common import MAX_ITEMS_PER_PAGE, handle_db_errors, parse_iso_datetime
 from extensions import db
 from models import Almacen, Cliente, Pago, Users, Venta, Gasto
 from schemas import pago_schema, pagos_schema, gastos_schema
-from utils.file_handlers import delete_file, get_presigned_url, save_file
+from utils.file_handlers import delete_file, get_presigned_url, get_presigned_urls, save_file
 from services.pago_service import PagoService, PagoValidationError
 
 # Configuración de Logging
@@ -68,9 +68,11 @@ class PagoResource(Resource):
         pagos_paginados = query.paginate(page=page, per_page=per_page, error_out=False)
         pagos_dump = pagos_schema.dump(pagos_paginados.items)
         
-        # MEJORA: Usar zip para una iteración más segura y pitónica.
+        # URLs de comprobantes de toda la página en una sola llamada por bucket
+        urls = get_presigned_urls(p.url_comprobante for p in pagos_paginados.items)
         for pago_obj, dump_item in zip(pagos_paginados.items, pagos_dump):
-             _get_presigned_url_for_item(dump_item, pago_obj.url_comprobante)
+            if pago_obj.url_comprobante:
+                dump_item['url_comprobante'] = urls.get(pago_obj.url_comprobante)
 
         return {
             "data": pagos_dump, 
@@ -2,17 +2,61 @@ from flask_restful import Resource
 from flask_jwt_extended import jwt_required, get_jwt
 from flask import request
 from models import Pedido, PedidoDetalle, Cliente, PresentacionProducto, Almacen, Inventario, Movimiento, VentaDetalle, Venta, Users
-from schemas import pedido_schema, pedidos_schema, venta_schema, clientes_schema, almacenes_schema, presentacion_schema
+from schemas import pedido_schema, venta_schema, clientes_schema, almacenes_schema, presentacion_schema
 from extensions import db
 from common import handle_db_errors, MAX_ITEMS_PER_PAGE, mismo_almacen_o_admin, parse_iso_datetime
 from datetime import datetime, timezone
 from decimal import Decimal, InvalidOperation
-from utils.file_handlers import get_presigned_url
+from utils.file_handlers import get_presigned_urls
 import logging
-from sqlalchemy import asc, desc
+from sqlalchemy import asc, desc, orm
 
 logger = logging.getLogger(__name__)
 
+# Serialización del listado sin Marshmallow: mismas claves y formatos que
+# pedidos_schema (fechas ISO, decimales como texto), construidos directamente
+# desde los atributos ya precargados. El detalle y las escrituras siguen usando el schema.
+def _iso(valor):
+    return valor.isoformat() if valor is not None else None
+
+def _decimal_str(valor):
+    return str(valor) if valor is not None else None
+
+def _pedido_detalle_to_dict(d):
+    presentacion = d.presentacion
+    return {
+        'presentacion': {
+            'id': presentacion.id,
+            'nombre': presentacion.nombre,
+            'precio_venta': _decimal_str(presentacion.precio_venta),
+            'url_foto': presentacion.url_foto
+        } if presentacion else None,
+        'precio_estimado': _decimal_str(d.precio_estimado),
+        'id': d.id,
+        'presentacion_id': d.presentacion_id,
+        'cantidad': d.cantidad,
+        'created_at': _iso(d.created_at),
+        'updated_at': _iso(d.updated_at)
+    }
+
+def _pedido_to_dict(p):
+    return {
+        'cliente': {'id': p.cliente.id, 'nombre': p.cliente.nombre} if p.cliente else None,
+        'almacen': {'id': p.almacen.id, 'nombre': p.almacen.nombre} if p.almacen else None,
+        'vendedor': {'id': p.vendedor.id, 'username': p.vendedor.username} if p.vendedor else None,
+        'detalles': [_pedido_detalle_to_dict(d) for d in p.detalles],
+        'total_estimado': _decimal_str(Decimal(p.total_estimado)),
+        'id': p.id,
+        'cliente_id': p.cliente_id,
+        'almacen_id': p.almacen_id,
+        'vendedor_id': p.vendedor_id,
+        'fecha_creacion': _iso(p.fecha_creacion),
+        'fecha_entrega': _iso(p.fecha_entrega),
+        'estado': p.estado,
+        'notas': p.notas,
+        'updated_at': _iso(p.updated_at)
+    }
+
 class PedidoResource(Resource):
     @jwt_required()
     @handle_db_errors
@@ -30,14 +74,13 @@ class PedidoResource(Resource):
             
             # --- GENERAR URLs PRE-FIRMADAS PARA DETALLES ---
             if 'detalles' in result and result['detalles']:
-                for detalle in result['detalles']:
-                    # Verificar estructura anidada
-                    if 'presentacion' in detalle and detalle['presentacion'] and 'url_foto' in detalle['presentacion']:
-                        s3_key = detalle['presentacion']['url_foto']
-                        if s3_key:
-                            # Reemplazar clave S3 con URL pre-firmada
-                            detalle['presentacion']['url_foto'] = get_presigned_url(s3_key)
-                        # else: url_foto ya es None o vacío, no hacer nada
+                # Verificar estructura anidada y firmar todas las fotos en una sola llamada
+                presentaciones = [d['presentacion'] for d in result['detalles'] if d.get('presentacion')]
+                urls = get_presigned_urls(p.get('url_foto') for p in presentaciones)
+                for presentacion in presentaciones:
+                    if presentacion.get('url_foto'):
+                        # Reemplazar clave S3 con URL pre-firmada
+                        presentacion['url_foto'] = urls.get(presentacion['url_foto'])
             # ---------------------------------------------
             
             return result, 200
@@ -59,7 +102,15 @@ class PedidoResource(Resource):
         order_func = desc if sort_order == 'desc' else asc
         # --- Fin Lógica de Ordenación ---
 
-        query = Pedido.query
+        # Todo lo que serializa _pedido_to_dict, precargado en consultas fijas por página;
+        # raiseload convierte cualquier carga perezosa olvidada en un error visible
+        query = Pedido.query.options(
+            orm.joinedload(Pedido.cliente),
+            orm.joinedload(Pedido.almacen),
+            orm.joinedload(Pedido.vendedor),
+            orm.selectinload(Pedido.detalles).joinedload(PedidoDetalle.presentacion),
+            orm.raiseload('*')
+        )
 
         # --- Aplicar Joins si es necesario para ordenar ---
         if sort_by == 'cliente_nombre':
@@ -106,7 +157,7 @@ class PedidoResource(Resource):
         pedidos = query.paginate(page=page, per_page=per_page, error_out=False)
         
         return {
-            "data": pedidos_schema.dump(pedidos.items),
+            "data": [_pedido_to_dict(p) for p in pedidos.items],
             "pagination": {
                 "total": pedidos.total,
                 "page": pedidos.page,
@@ -344,14 +395,12 @@ class PedidoFormDataResource(Resource):
 
             # Obtener Presentaciones Activas
             presentaciones_activas = PresentacionProducto.query.filter_by(activo=True).order_by(PresentacionProducto.nombre).all()
+            urls_fotos = get_presigned_urls(p.url_foto for p in presentaciones_activas)
             presentaciones_data = []
             for p in presentaciones_activas:
                 dumped_p = presentacion_schema.dump(p)
                 # URL pre-firmada
-                if p.url_foto:
-                    dumped_p['url_foto'] = get_presigned_url(p.url_foto)
-                else:
-                    dumped_p['url_foto'] = None
+                dumped_p['url_foto'] = urls_fotos.get(p.url_foto)
                 presentaciones_data.append(dumped_p)
             
             # Devolver siempre las tres listas
@@ -7,7 +7,7 @@ from models import Almacen
 from schemas import presentacion_schema, presentaciones_schema # Asegúrate que existan y sean correctos
 from extensions import db
 from common import handle_db_errors, MAX_ITEMS_PER_PAGE, rol_requerido
-from utils.file_handlers import save_file, delete_file, get_presigned_url
+from utils.file_handlers import save_file, delete_file, get_presigned_url, get_presigned_urls
 # import os # No usado directamente aquí
 # from werkzeug.datastructures import FileStorage # No usado directamente aquí
 # from flask import current_app # No usado directamente aquí
@@ -59,16 +59,15 @@ class PresentacionResource(Resource):
         resultado = query.paginate(page=page, per_page=per_page, error_out=False)
 
         # Preparar datos para respuesta, incluyendo URLs pre-firmadas para la lista
+        # (una sola llamada a Supabase por bucket para toda la página)
+        urls_fotos = get_presigned_urls(item.url_foto for item in resultado.items)
         items_data = []
         for item in resultado.items:
              # --- CORRECCIÓN: Usar schema singular si presentaciones_schema es para listas ---
              # Si 'presentaciones_schema' es Many=True, usarlo así está bien.
              # Si es igual a 'presentacion_schema', usar presentacion_schema.dump(item)
             dumped_item = presentacion_schema.dump(item) # Asumiendo detalle individual
-            if item.url_foto:
-                dumped_item['url_foto'] = get_presigned_url(item.url_foto)
-            else:
-                dumped_item['url_foto'] = None # Asegurar que el campo exista
+            dumped_item['url_foto'] = urls_fotos.get(item.url_foto) # None si no tiene foto
             items_data.append(dumped_item)
 
         # --- CORRECCIÓN: Devolver diccionario directamente ---
@@ -11,7 +11,7 @@ from models import (
     Lote, Pago, Inventario, Almacen
 )
 from common import handle_db_errors
-from utils.file_handlers import get_presigned_url
+from utils.file_handlers import get_presigned_urls
 
 logger = logging.getLogger(__name__)
 
@@ -369,9 +369,10 @@ class DepositosHistorialResource(Resource):
             Pago.fecha_deposito
         )
         resultados = query.order_by(Pago.fecha_deposito.desc()).all()
+        urls = get_presigned_urls(r.comprobante_url for r in resultados)
         response = []
         for r in resultados:
-            presigned = get_presigned_url(r.comprobante_url) if r.comprobante_url else None
+            presigned = urls.get(r.comprobante_url)
             response.append({
                 'fecha_deposito': r.fecha_deposito.strftime('%Y-%m-%d %H:%M') if r.fecha_deposito else None,
                 'referencia': r.referencia or "Sin Referencia",
@@ -6,8 +6,7 @@ from flask import request
 from models import Users, Almacen
 from schemas import user_schema, users_schema
 from extensions import db
-from common import handle_db_errors, rol_requerido, validate_pagination_params, create_pagination_response, validate_password
-from werkzeug.security import generate_password_hash
+from common import handle_db_errors, rol_requerido, validate_pagination_params, create_pagination_response, validate_password, hash_password, revocar_tokens_usuario
 import logging
 import config
 
@@ -104,7 +103,7 @@ class UserResource(Resource):
                     return {"error": "ID de almacén inválido"}, 400
             
             # Hashear la contraseña de forma segura
-            data['password'] = generate_password_hash(password, method='pbkdf2:sha256:150000')
+            data['password'] = hash_password(password)
             
             # Crear usuario
             nuevo_usuario = user_schema.load(data)
@@ -159,7 +158,7 @@ class UserResource(Resource):
                     return {"error": error_msg}, 400
                     
                 # Hashear la contraseña
-                data['password'] = generate_password_hash(password, method='pbkdf2:sha256:150000')
+                data['password'] = hash_password(password)
             
             # Validar rol si se proporciona
             if 'rol' in data:
@@ -179,9 +178,17 @@ class UserResource(Resource):
                 except (ValueError, TypeError):
                     return {"error": "ID de almacén inválido"}, 400
             
+            # Los tokens llevan rol y almacen_id como claims: si cambian (o la contraseña)
+            # los tokens ya emitidos dejan de ser válidos
+            revocar = 'password' in data or any(
+                campo in data and data[campo] != getattr(usuario, campo) for campo in ('rol', 'almacen_id')
+            )
+
             # Actualizar usuario
             updated_usuario = user_schema.load(data, instance=usuario, partial=True)
             db.session.commit()
+            if revocar:
+                revocar_tokens_usuario(usuario.id)
             
             logger.info(f"Usuario actualizado: {usuario.id} - {usuario.username}")
             
@@ -223,6 +230,7 @@ class UserResource(Resource):
             username = usuario.username  # Guardar para el log
             db.session.delete(usuario)
             db.session.commit()
+            revocar_tokens_usuario(user_id)
             
             logger.info(f"Usuario eliminado: {user_id} - {username}")
             return {"message": "Usuario eliminado correctamente"}, 200
@@ -5,7 +5,7 @@ from models import Venta, VentaDetalle, Inventario, Cliente, PresentacionProduct
 from schemas import venta_schema, ventas_schema, clientes_schema, almacenes_schema, presentacion_schema
 from extensions import db
 from common import handle_db_errors, MAX_ITEMS_PER_PAGE, mismo_almacen_o_admin, parse_iso_datetime
-from utils.file_handlers import get_presigned_url
+from utils.file_handlers import get_presigned_urls
 from services.pago_service import PagoService
 from services.venta_service import VentaService, StockInsuficienteError
 from datetime import datetime, timezone
@@ -33,11 +33,11 @@ class VentaResource(Resource):
             result = venta_schema.dump(venta)
             
             if 'detalles' in result and result['detalles']:
-                for detalle in result['detalles']:
-                    if 'presentacion' in detalle and detalle['presentacion'] and 'url_foto' in detalle['presentacion']:
-                        s3_key = detalle['presentacion']['url_foto']
-                        if s3_key:
-                            detalle['presentacion']['url_foto'] = get_presigned_url(s3_key)
+                presentaciones = [d['presentacion'] for d in result['detalles'] if d.get('presentacion')]
+                urls = get_presigned_urls(p.get('url_foto') for p in presentaciones)
+                for presentacion in presentaciones:
+                    if presentacion.get('url_foto'):
+                        presentacion['url_foto'] = urls.get(presentacion['url_foto'])
             
             return result, 200
         
@@ -51,7 +51,16 @@ class VentaResource(Resource):
         }
 
         get_all = request.args.get('all', 'false').lower() == 'true'
-        query = Venta.query
+        # Todo lo que serializa ventas_schema, precargado en consultas fijas por página;
+        # raiseload convierte cualquier carga perezosa olvidada en un error visible
+        query = Venta.query.options(
+            orm.joinedload(Venta.cliente),
+            orm.joinedload(Venta.almacen),
+            orm.joinedload(Venta.vendedor),
+            orm.selectinload(Venta.pagos),
+            orm.selectinload(Venta.detalles).joinedload(VentaDetalle.presentacion),
+            orm.raiseload('*')
+        )
 
         if not is_admin:
             query = query.filter_by(vendedor_id=current_user_id)
@@ -291,7 +300,7 @@ class VentaFormDataResource(Resource):
             if cliente_ids:
                 saldos_map = obtener_saldos_pendientes_clientes(cliente_ids)
                 for c in clientes:
-                    c._saldo_pendiente_cached = saldos_map.get(c.id, 0)
+                    c.saldo_pendiente = saldos_map.get(c.id, 0)
 
             todos_almacenes = Almacen.query.order_by(Almacen.nombre).all()
 
@@ -313,6 +322,7 @@ class VentaFormDataResource(Resource):
             ).order_by(PresentacionProducto.nombre).all()
 
             # Agrupar inventario por presentacion_id, sumando stock de todos los lotes
+            urls_fotos = get_presigned_urls(inv.presentacion.url_foto for inv in inventario_disponible)
             presentaciones_agrupadas = {}
             for inventario in inventario_disponible:
                 presentacion = inventario.presentacion
@@ -323,7 +333,7 @@ class VentaFormDataResource(Resource):
                     
                     # Generar URL pre-firmada para la foto
                     if presentacion.url_foto:
-                        dumped_presentacion['url_foto'] = get_presigned_url(presentacion.url_foto)
+                        dumped_presentacion['url_foto'] = urls_fotos.get(presentacion.url_foto)
                     
                     dumped_presentacion['stock_disponible'] = 0.0
                     presentaciones_agrupadas[pres_id] = dumped_presentacion
@@ -97,10 +97,11 @@ class VoiceCommandResource(Resource):
             
             if not cliente:
                 # Intento de búsqueda difusa con PostgreSQL similarity
-                # Requiere la extensión pg_trgm
+                # Requiere la extensión pg_trgm; el operador % (umbral 0.3 por defecto)
+                # usa el índice idx_cliente_nombre_trgm
                 try:
                     cliente = Cliente.query.filter(
-                        func.similarity(Cliente.nombre, cliente_nombre) > 0.3
+                        Cliente.nombre.op('%')(cliente_nombre)
                     ).order_by(
                         func.similarity(Cliente.nombre, cliente_nombre).desc()
                     ).first()
@@ -119,6 +119,7 @@ class ClienteSchema(SQLAlchemyAutoSchema):
         unknown = EXCLUDE
         include_fk = True
         sqla_session = db.session 
+        exclude = ('proxima_compra_date',)
 
 
 class MovimientoSchema(SQLAlchemyAutoSchema):
@@ -257,7 +258,16 @@ class ComandoVozLogSchema(SQLAlchemyAutoSchema):
         sqla_session = db.session
         unknown = EXCLUDE
 
+class LoginSchema(Schema):
+    """Credenciales de /auth (solo validación, no está ligado a un modelo)."""
+    username = fields.String(required=True, error_messages={'required': 'El nombre de usuario es requerido'})
+    password = fields.String(required=True, error_messages={'required': 'La contraseña es requerida'})
+
+    class Meta:
+        unknown = EXCLUDE
+
 # Inicializar esquemas
+login_schema = LoginSchema()
 user_schema = UserSchema()
 users_schema = UserSchema(many=True)
 
@@ -7,6 +7,8 @@ from decimal import Decimal, InvalidOperation
 from datetime import datetime, timezone
 from werkzeug.exceptions import NotFound, Forbidden
 
+from sqlalchemy import func
+
 from extensions import db
 from models import Pago, Venta, Cliente, Users
 from utils.file_handlers import save_file, delete_file
@@ -28,6 +30,14 @@ class PagoService:
             raise NotFound("Pago no encontrado.")
         return pago
 
+    @staticmethod
+    def _totales_pagados(venta_ids):
+        """Devuelve {venta_id: total pagado} para varias ventas con un solo GROUP BY."""
+        filas = db.session.query(Pago.venta_id, func.sum(Pago.monto)).filter(
+            Pago.venta_id.in_(venta_ids)
+        ).group_by(Pago.venta_id).all()
+        return {venta_id: total or Decimal('0') for venta_id, total in filas}
+
     @staticmethod
     def _validate_monto(venta, monto, pago_existente_id=None):
         """Valida que el monto de un pago no exceda el saldo pendiente de la venta."""
@@ -44,6 +54,9 @@ class PagoService:
         query = Pago.query.options(
             db.joinedload(Pago.venta).joinedload(Venta.cliente),
             db.joinedload(Pago.venta).joinedload(Venta.almacen),
+            # El listado solo muestra id/total/cliente de la venta: no precargar sus colecciones
+            db.joinedload(Pago.venta).lazyload(Venta.detalles),
+            db.joinedload(Pago.venta).lazyload(Venta.pagos),
             db.joinedload(Pago.usuario)
         )
         if venta_id := filters.get('venta_id'):
@@ -189,8 +202,13 @@ class PagoService:
             if len(ventas_map) != len(venta_ids):
                 raise NotFound("Una o más ventas no encontradas. Venta no encontrada.")
 
+            # Pagos previos de todas las ventas en una sola consulta agregada
+            totales_pagados = PagoService._totales_pagados(venta_ids)
+
             pagos_a_crear_info = []
-            saldos_provisionales = {vid: v.saldo_pendiente for vid, v in ventas_map.items()}
+            saldos_provisionales = {
+                vid: v.total - totales_pagados.get(vid, Decimal('0')) for vid, v in ventas_map.items()
+            }
 
             for pago_info in pagos_data_list:
                 venta_id = pago_info.get('venta_id')
@@ -232,8 +250,7 @@ class PagoService:
                 pagos_creados.append(nuevo_pago)
             
             db.session.flush()
-            for venta in ventas_map.values():
-                venta.actualizar_estado()
+            Venta.recalcular_estados(list(ventas_map))
 
             return pagos_creados
         except Exception:
@@ -1,6 +1,6 @@
 import os
-import requests
 import time
+from extensions import http_session
 import logging
 
 logger = logging.getLogger(__name__)
@@ -58,7 +58,7 @@ class SunatService:
 
         try:
             logger.info(f"Solicitando token de acceso SUNAT en ambiente: {self.ambiente}")
-            response = requests.post(self.token_url, data=payload, headers=headers, timeout=15)
+            response = http_session.post(self.token_url, data=payload, headers=headers, timeout=15)
             
             if response.status_code != 200:
                 try:
@@ -97,7 +97,7 @@ class SunatService:
 
         try:
             logger.info(f"Enviando Guía de Remisión a SUNAT: {datos_guia.get('serie')}-{datos_guia.get('numero')}")
-            response = requests.post(url, json=datos_guia, headers=headers, timeout=20)
+            response = http_session.post(url, json=datos_guia, headers=headers, timeout=20)
             
             if response.status_code in [200, 201]:
                 return response.json()
@@ -127,7 +127,7 @@ class SunatService:
 
         try:
             logger.info(f"Consultando estado de ticket SUNAT: {ticket}")
-            response = requests.get(url, headers=headers, timeout=15)
+            response = http_session.get(url, headers=headers, timeout=15)
             response.raise_for_status()
             return response.json()
         except Exception as e:
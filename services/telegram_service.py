@@ -1,6 +1,6 @@
 import os
-import requests
 import logging
+from extensions import http_session
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +29,7 @@ class TelegramService:
             payload["reply_markup"] = reply_markup
 
         try:
-            response = requests.post(url, json=payload, timeout=10)
+            response = http_session.post(url, json=payload, timeout=10)
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -55,7 +55,7 @@ class TelegramService:
             payload["reply_markup"] = reply_markup
 
         try:
-            response = requests.post(url, json=payload, timeout=10)
+            response = http_session.post(url, json=payload, timeout=10)
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -77,7 +77,7 @@ class TelegramService:
             payload["text"] = text
 
         try:
-            response = requests.post(url, json=payload, timeout=10)
+            response = http_session.post(url, json=payload, timeout=10)
             response.raise_for_status()
             return response.json()
         except Exception as e:
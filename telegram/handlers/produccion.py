@@ -64,7 +64,7 @@ class ProduccionHandler:
             inherited_lote_id = None
             
             for componente in receta.componentes:
-                cantidad_req = Decimal(str(componente.cantidad_necesaria)) * cantidad_a_producir
+                cantidad_req = componente.cantidad_necesaria * cantidad_a_producir
                 
                 if componente.tipo_consumo == 'materia_prima':
                     lotes_disponibles = Lote.query.filter(
@@ -75,7 +75,7 @@ class ProduccionHandler:
                     
                     cantidad_acumulada = Decimal("0")
                     for lote in lotes_disponibles:
-                        lote_disponible = Decimal(str(lote.cantidad_disponible_kg))
+                        lote_disponible = lote.cantidad_disponible_kg
                         lotes_seleccionados.append({
                             "componente_presentacion_id": componente.componente_presentacion_id,
                             "lote_id": lote.id,
@@ -96,7 +96,7 @@ class ProduccionHandler:
                 
                 elif componente.tipo_consumo == 'insumo':
                     invs_insumo = Inventario.query.filter_by(almacen_id=almacen_id, presentacion_id=componente.componente_presentacion_id).all()
-                    insumo_disponible = sum(Decimal(str(i.cantidad)) for i in invs_insumo) if invs_insumo else Decimal("0")
+                    insumo_disponible = sum((i.cantidad for i in invs_insumo), Decimal("0"))
                     detalles_consumo.append(f"• Consumir insumo '{componente.componente_presentacion.nombre}': {cantidad_req} unidades (Disp: {insumo_disponible})")
                     if insumo_disponible < cantidad_req:
                         warnings.append(f"⚠️ Stock de insumo '{componente.componente_presentacion.nombre}' es insuficiente. Req: {cantidad_req}, Disp: {insumo_disponible}.")
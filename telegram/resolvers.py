@@ -193,9 +193,10 @@ def buscar_cliente_db(nombre: str, telefono: str = None, ruc: str = None):
         if cli:
             return cli
 
-        # Búsqueda por similitud léxica (Postgres pg_trgm)
+        # Búsqueda por similitud léxica (Postgres pg_trgm). El operador % (umbral
+        # pg_trgm.similarity_threshold, 0.3 por defecto) usa idx_cliente_nombre_trgm
         try:
-            cli = Cliente.query.filter(func.similarity(Cliente.nombre, nombre) > 0.3).order_by(func.similarity(Cliente.nombre, nombre).desc()).first()
+            cli = Cliente.query.filter(Cliente.nombre.op('%')(nombre)).order_by(func.similarity(Cliente.nombre, nombre).desc()).first()
             if cli:
                 return cli
         except Exception as e:
@@ -0,0 +1,112 @@
+# tests/conftest.py
+import os
+import sys
+
+# Variables de entorno ANTES de importar app (igual que en app.py con load_dotenv)
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+os.environ.setdefault('JWT_SECRET_KEY', 'ci-testing-jwt-secret-key-32-chars-minimum')
+os.environ.setdefault('FLASK_ENV', 'testing')
+# Sin Redis: las cachés quedan desactivadas y las pruebas no dependen de un servidor
+os.environ['REDIS_URL'] = ''
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import UTC, datetime, timedelta  # noqa: E402
+from decimal import Decimal  # noqa: E402
+
+import pytest  # noqa: E402
+from flask_jwt_extended import create_access_token  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+import models as m  # noqa: E402
+from app import app as flask_app  # noqa: E402
+from extensions import db  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def datos(app):
+    """Almacén, usuario admin, cliente, presentación y una venta a crédito de 100."""
+    almacen = m.Almacen(nombre='Principal', ciudad='Lima')
+    db.session.add(almacen)
+    db.session.flush()
+    admin = m.Users(username='admin', password=generate_password_hash('secret123'),
+                    rol='admin', almacen_id=almacen.id)
+    producto = m.Producto(nombre='Carbón', precio_compra=Decimal('10'))
+    cliente = m.Cliente(nombre='Juan Perez', telefono='999888777', ciudad='Lima',
+                        frecuencia_compra_dias=7,
+                        ultima_fecha_compra=datetime.now(UTC) - timedelta(days=3))
+    db.session.add_all([admin, producto, cliente])
+    db.session.flush()
+    presentacion = m.PresentacionProducto(producto_id=producto.id, nombre='Saco 5kg',
+                                          capacidad_kg=Decimal('5'), tipo='procesado',
+                                          precio_venta=Decimal('20'))
+    db.session.add(presentacion)
+    db.session.flush()
+    venta = m.Venta(cliente_id=cliente.id, almacen_id=almacen.id, vendedor_id=admin.id,
+                    fecha=datetime.now(UTC), total=Decimal('100'),
+                    tipo_pago='credito', estado_pago='pendiente')
+    db.session.add(venta)
+    db.session.commit()
+    return {'almacen': almacen, 'admin': admin, 'cliente': cliente,
+            'presentacion': presentacion, 'venta': venta}
+
+
+@pytest.fixture
+def auth_headers(datos):
+    admin = datos['admin']
+    token = create_access_token(
+        identity=str(admin.id),
+        additional_claims={'username': admin.username, 'rol': admin.rol, 'almacen_id': admin.almacen_id}
+    )
+    return {'Authorization': f'Bearer {token}'}
+
+
+class RedisFalso(dict):
+    """Lo mínimo de redis.Redis que usan las cachés, sobre un dict en memoria."""
+
+    def get(self, clave):
+        return dict.get(self, clave)
+
+    def mget(self, *claves):
+        return [dict.get(self, c) for c in claves]
+
+    def set(self, clave, valor, ex=None):
+        self[clave] = valor if isinstance(valor, bytes) else str(valor).encode()
+        return True
+
+    def setex(self, clave, ttl, valor):
+        return self.set(clave, valor)
+
+    def incr(self, clave):
+        valor = int(dict.get(self, clave, b'0')) + 1
+        self[clave] = str(valor).encode()
+        return valor
+
+    def delete(self, *claves):
+        return sum(self.pop(c, None) is not None for c in claves)
+
+
+@pytest.fixture
+def redis_falso(monkeypatch):
+    """Sustituye redis_client en los módulos que lo importaron."""
+    import common
+    from resources import cliente_resource, dashboard_resource
+
+    falso = RedisFalso()
+    for modulo in (common, cliente_resource, dashboard_resource):
+        monkeypatch.setattr(modulo, 'redis_client', falso)
+    return falso
@@ -0,0 +1,37 @@
+# tests/test_app.py
+# PROXY_FIX_X_FOR se lee al importar app.py: cada caso corre en un proceso aparte
+import os
+import subprocess
+import sys
+import textwrap
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+IP_DEL_CLIENTE = textwrap.dedent("""
+    from flask_limiter.util import get_remote_address
+
+    from app import app
+
+    app.add_url_rule('/_ip', 'ip', lambda: get_remote_address())
+    respuesta = app.test_client().get('/_ip', headers={'X-Forwarded-For': '203.0.113.7'},
+                                      environ_base={'REMOTE_ADDR': '10.0.0.1'})
+    print(respuesta.get_data(as_text=True))
+""")
+
+
+def _ip_vista_por_el_limiter(**env_extra):
+    env = {k: v for k, v in os.environ.items() if k != 'PROXY_FIX_X_FOR'}
+    env.update(DATABASE_URL='sqlite:///:memory:', FLASK_ENV='testing', REDIS_URL='',
+               JWT_SECRET_KEY='ci-testing-jwt-secret-key-32-chars-minimum', **env_extra)
+    resultado = subprocess.run([sys.executable, '-c', IP_DEL_CLIENTE], cwd=RAIZ, env=env,
+                               capture_output=True, text=True, timeout=120)
+    assert resultado.returncode == 0, resultado.stderr
+    return resultado.stdout.strip().splitlines()[-1]
+
+
+def test_limites_por_ip_usan_la_ip_del_cliente_detras_del_proxy():
+    assert _ip_vista_por_el_limiter(PROXY_FIX_X_FOR='1') == '203.0.113.7'
+
+
+def test_sin_proxy_no_se_confia_en_x_forwarded_for():
+    assert _ip_vista_por_el_limiter() == '10.0.0.1'
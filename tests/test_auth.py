@@ -0,0 +1,124 @@
+# tests/test_auth.py
+# JWT_BLOCKLIST_ENABLED se decide al importar app.py: el flujo de revocación corre en un
+# proceso aparte con la revocación habilitada y un Redis en memoria
+import os
+import subprocess
+import sys
+import textwrap
+
+from werkzeug.security import generate_password_hash
+
+import models as m
+from common import hash_password, verificar_password
+from extensions import db
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+FLUJO_REVOCACION = textwrap.dedent("""
+    import app as app_mod
+    import common
+    import models as m
+    from extensions import db
+
+    class RedisFalso(dict):
+        def mget(self, *claves):
+            return [self.get(c) for c in claves]
+
+        def setex(self, clave, ttl, valor):
+            self[clave] = str(valor).encode()
+
+        def incr(self, clave):
+            self[clave] = str(int(self.get(clave, b'0')) + 1).encode()
+
+    falso = RedisFalso()
+    app_mod.redis_client = common.redis_client = falso
+    app = app_mod.app
+    assert common.JWT_BLOCKLIST_ENABLED
+
+    with app.app_context():
+        db.create_all()
+        almacen = m.Almacen(nombre='Principal')
+        db.session.add(almacen)
+        db.session.flush()
+        for nombre in ('admin', 'vendedor'):
+            db.session.add(m.Users(username=nombre, password=common.hash_password('secret123'),
+                                   rol='admin' if nombre == 'admin' else 'usuario', almacen_id=almacen.id))
+        db.session.commit()
+        vendedor_id = m.Users.query.filter_by(username='vendedor').one().id
+
+    cliente = app.test_client()
+
+    def login(usuario):
+        r = cliente.post('/auth', json={'username': usuario, 'password': 'secret123'})
+        return {'Authorization': 'Bearer ' + r.get_json()['access_token']}
+
+    # Logout: el token usado deja de ser válido
+    admin = login('admin')
+    assert cliente.get('/clientes', headers=admin).status_code == 200
+    r = cliente.post('/auth/logout', headers=admin)
+    assert r.status_code == 200 and r.get_json()['revocado'] is True
+    r = cliente.get('/clientes', headers=admin)
+    assert r.status_code == 401 and r.get_json()['error'] == 'token_revoked'
+
+    # Cambio de rol: se revocan los tokens del usuario emitidos hasta ese momento
+    admin = login('admin')
+    vendedor = login('vendedor')
+    assert cliente.get('/clientes', headers=vendedor).status_code == 200
+    r = cliente.put(f'/usuarios/{vendedor_id}', json={'rol': 'gerente'}, headers=admin)
+    assert r.status_code == 200, r.get_data(as_text=True)
+    assert cliente.get('/clientes', headers=vendedor).status_code == 401
+    assert cliente.get('/clientes', headers=admin).status_code == 200
+
+    # Un cambio que no afecta a los claims no revoca nada
+    clave = f'jwt:revoked_user:{vendedor_id}'
+    del falso[clave]
+    cliente.put(f'/usuarios/{vendedor_id}', json={'rol': 'gerente'}, headers=admin)
+    assert clave not in falso
+""")
+
+
+def test_logout_y_cambio_de_rol_revocan_tokens():
+    env = {k: v for k, v in os.environ.items() if not k.startswith('GUNICORN_')}
+    env.update({
+        'DATABASE_URL': 'sqlite:///:memory:',
+        'JWT_SECRET_KEY': 'ci-testing-jwt-secret-key-32-chars-minimum',
+        'FLASK_ENV': 'testing',
+        # El cliente de Redis conecta de forma perezosa: se sustituye antes del primer uso
+        'REDIS_URL': 'redis://localhost:1/0',
+        'JWT_BLOCKLIST_ENABLED': '1',
+    })
+    resultado = subprocess.run([sys.executable, '-c', FLUJO_REVOCACION], cwd=RAIZ, env=env,
+                               capture_output=True, text=True, timeout=120)
+    assert resultado.returncode == 0, resultado.stderr
+
+
+def test_logout_sin_revocacion_habilitada(client, auth_headers):
+    respuesta = client.post('/auth/logout', headers=auth_headers)
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()['revocado'] is False
+
+
+def test_login_rehashea_a_argon2(client, app):
+    db.session.add(m.Users(username='legado', password=generate_password_hash('secret123'), rol='usuario'))
+    db.session.commit()
+
+    respuesta = client.post('/auth', json={'username': 'Legado', 'password': 'secret123'})
+
+    assert respuesta.status_code == 200
+    usuario = m.Users.query.filter_by(username='legado').one()
+    assert usuario.password.startswith('$argon2')
+    assert verificar_password(usuario.password, 'secret123')
+
+
+def test_login_credenciales_invalidas(client, datos):
+    assert client.post('/auth', json={'username': 'admin', 'password': 'incorrecta1'}).status_code == 401
+    assert client.post('/auth', json={'username': 'nadie', 'password': 'secret123'}).status_code == 401
+
+
+def test_login_con_hash_argon2_no_lo_reescribe(client, app):
+    hash_actual = hash_password('secret123')
+    db.session.add(m.Users(username='moderno', password=hash_actual, rol='usuario'))
+    db.session.commit()
+
+    assert client.post('/auth', json={'username': 'moderno', 'password': 'secret123'}).status_code == 200
+    assert m.Users.query.filter_by(username='moderno').one().password == hash_actual
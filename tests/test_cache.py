@@ -0,0 +1,115 @@
+# tests/test_cache.py
+from datetime import UTC, datetime
+from decimal import Decimal
+
+import orjson
+import pytest
+
+import models as m
+from extensions import db
+from resources import cliente_resource
+
+
+def _claves_export(redis_falso):
+    return [k for k in redis_falso if k.startswith('cliente_export:') and k != 'cliente_export:version']
+
+
+def test_export_pequeno_se_guarda_en_cache(client, auth_headers, redis_falso):
+    primera = client.get('/clientes/exportar', headers=auth_headers)
+    assert primera.status_code == 200
+    assert len(_claves_export(redis_falso)) == 1
+
+    segunda = client.get('/clientes/exportar', headers=auth_headers)
+    assert segunda.data == primera.data
+
+
+def test_export_sobre_el_limite_no_se_guarda_en_cache(client, auth_headers, redis_falso, monkeypatch):
+    monkeypatch.setattr(cliente_resource, 'EXPORT_CACHE_MAX_BYTES', 100)
+
+    respuesta = client.get('/clientes/exportar', headers=auth_headers)
+
+    assert respuesta.status_code == 200
+    assert len(respuesta.data) > 100
+    assert _claves_export(redis_falso) == []
+
+
+def _pagar(datos, monto):
+    db.session.add(m.Pago(venta_id=datos['venta'].id, usuario_id=datos['admin'].id, monto=Decimal(monto),
+                          metodo_pago='efectivo', fecha=datetime.now(UTC)))
+    db.session.commit()
+
+
+def _saldo_listado(client, auth_headers):
+    return client.get('/clientes', headers=auth_headers).get_json()['data'][0]['saldo_pendiente']
+
+
+def test_lista_clientes_se_invalida_con_un_pago(client, auth_headers, redis_falso, datos):
+    assert _saldo_listado(client, auth_headers) == '100.00'
+    assert any(k.startswith('clientes_list:') and k != 'clientes_list:version' for k in redis_falso)
+
+    _pagar(datos, '40')
+
+    assert _saldo_listado(client, auth_headers) == '60.00'
+
+
+def test_lista_clientes_se_invalida_con_una_venta(client, auth_headers, redis_falso, datos):
+    assert _saldo_listado(client, auth_headers) == '100.00'
+
+    db.session.add(m.Venta(cliente_id=datos['cliente'].id, almacen_id=datos['almacen'].id,
+                           vendedor_id=datos['admin'].id, fecha=datetime.now(UTC),
+                           total=Decimal('50'), tipo_pago='credito', estado_pago='pendiente'))
+    db.session.commit()
+
+    assert _saldo_listado(client, auth_headers) == '150.00'
+
+
+def _version(redis_falso, clave):
+    return int(redis_falso.get(clave) or 0)
+
+
+@pytest.mark.parametrize('clave', ['clientes_list:version', 'cliente_export:version', 'dashboard:version'])
+def test_versiones_suben_con_escrituras_de_pagos(redis_falso, datos, clave):
+    inicial = _version(redis_falso, clave)
+
+    _pagar(datos, '40')
+    assert _version(redis_falso, clave) == inicial + 1
+
+    # UPDATE en bloque (sin objetos en la sesión) también invalida
+    m.Venta.recalcular_estados([datos['venta'].id])
+    db.session.commit()
+    assert _version(redis_falso, clave) == inicial + 2
+
+
+def test_versiones_no_suben_sin_cambios_relevantes(redis_falso, datos):
+    inicial = dict(redis_falso)
+
+    datos['presentacion'].nombre = 'Saco 10kg'
+    db.session.commit()
+
+    assert dict(redis_falso) == inicial
+
+
+def test_rollback_no_invalida(redis_falso, datos):
+    inicial = dict(redis_falso)
+
+    db.session.add(m.Pago(venta_id=datos['venta'].id, usuario_id=datos['admin'].id, monto=Decimal('1'),
+                          metodo_pago='efectivo', fecha=datetime.now(UTC)))
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+
+    assert dict(redis_falso) == inicial
+
+
+def test_dashboard_se_sirve_desde_cache_hasta_un_pago(client, auth_headers, redis_falso, datos):
+    primera = client.get('/dashboard', headers=auth_headers).get_json()
+    assert primera['total_deuda_clientes'] == 100.0
+    # Una segunda petición con los mismos datos no vuelve a calcularse: se devuelve lo guardado
+    claves = [k for k in redis_falso if k.startswith('dashboard:') and k != 'dashboard:version']
+    assert len(claves) == 1
+    redis_falso[claves[0]] = orjson.dumps(dict(primera, total_deuda_clientes=-1))
+    assert client.get('/dashboard', headers=auth_headers).get_json()['total_deuda_clientes'] == -1
+
+    _pagar(datos, '40')
+
+    assert client.get('/dashboard', headers=auth_headers).get_json()['total_deuda_clientes'] == 60.0
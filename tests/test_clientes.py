@@ -0,0 +1,38 @@
+# tests/test_clientes.py
+import models as m
+from extensions import db
+
+
+def _crear_clientes(n):
+    db.session.add_all([m.Cliente(nombre=f'Cliente {i}') for i in range(n)])
+    db.session.commit()
+
+
+def test_listado_keyset_recorre_todos_los_clientes(client, auth_headers):
+    _crear_clientes(4)
+    esperados = [c.id for c in m.Cliente.query.order_by(m.Cliente.id)]
+
+    respuesta = client.get('/clientes?per_page=2', headers=auth_headers).get_json()
+    vistos = [c['id'] for c in respuesta['data']]
+    cursor = respuesta['pagination']['next_cursor']
+    while cursor:
+        respuesta = client.get(f'/clientes?per_page=2&cursor={cursor}', headers=auth_headers).get_json()
+        assert 'total' not in respuesta['pagination']
+        vistos += [c['id'] for c in respuesta['data']]
+        cursor = respuesta['pagination']['next_cursor']
+
+    assert vistos == esperados
+
+
+def test_listado_sin_total(client, auth_headers):
+    _crear_clientes(2)
+
+    pagination = client.get('/clientes?per_page=2&incluir_total=0', headers=auth_headers).get_json()['pagination']
+
+    assert pagination['has_next'] is True
+    assert pagination['next_cursor'] is not None
+    assert 'total' not in pagination
+
+
+def test_listado_cursor_invalido(client, auth_headers):
+    assert client.get('/clientes?cursor=zz', headers=auth_headers).status_code == 400
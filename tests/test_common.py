@@ -0,0 +1,38 @@
+# tests/test_common.py
+from decimal import Decimal
+
+import pytest
+
+from common import decode_cursor, encode_cursor, make_json_serializable
+
+
+@pytest.mark.parametrize('valores', [
+    (1,),
+    ('2024-05-01', 42),
+    (None, 7),
+    ('Pérez & Cía', 3),
+])
+def test_cursor_ida_y_vuelta(valores):
+    cursor = encode_cursor(valores)
+    assert '=' not in cursor
+    assert decode_cursor(cursor, len(valores)) == list(valores)
+
+
+@pytest.mark.parametrize('cursor', [
+    'no-es-base64!!',
+    encode_cursor((1, 2))[:-3],
+    'eyJhIjoxfQ',  # {"a":1}: JSON válido pero no es una lista
+])
+def test_cursor_invalido(cursor):
+    with pytest.raises(ValueError, match='Cursor de paginación inválido') as exc:
+        decode_cursor(cursor, 2)
+    assert exc.value.__cause__ is None
+
+
+def test_cursor_con_cantidad_distinta():
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor((1, 2)), 1)
+
+
+def test_make_json_serializable_conserva_claves():
+    assert make_json_serializable({1: [Decimal('1.50')], 'a': {2: None}}) == {1: [1.5], 'a': {2: None}}
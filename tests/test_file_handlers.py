@@ -0,0 +1,72 @@
+# tests/test_file_handlers.py
+import pytest
+
+import models as m
+from extensions import db
+from utils import file_handlers
+
+
+class BucketFalso:
+    def __init__(self, llamadas, nombre):
+        self.llamadas, self.nombre = llamadas, nombre
+
+    def create_signed_urls(self, rutas, expiracion):
+        self.llamadas.append((self.nombre, sorted(rutas)))
+        return [{'path': r, 'signedURL': f'https://firmada/{self.nombre}/{r}',
+                 'error': 'no existe' if r.startswith('faltante') else None} for r in rutas]
+
+
+class SupabaseFalso:
+    def __init__(self):
+        self.llamadas = []
+        self.storage = self
+
+    def from_(self, bucket):
+        return BucketFalso(self.llamadas, bucket)
+
+
+@pytest.fixture
+def supabase_falso(monkeypatch):
+    falso = SupabaseFalso()
+    monkeypatch.setattr(file_handlers, 'supabase', falso)
+    return falso
+
+
+def test_una_llamada_por_bucket(supabase_falso):
+    urls = file_handlers.get_presigned_urls([
+        'presentaciones/a.webp', 'presentaciones/b.webp', 'presentaciones/a.webp',
+        'pagos/c.pdf', None, '',
+    ])
+
+    assert sorted(supabase_falso.llamadas) == [('pagos', ['c.pdf']), ('presentaciones', ['a.webp', 'b.webp'])]
+    assert urls == {
+        'presentaciones/a.webp': 'https://firmada/presentaciones/a.webp',
+        'presentaciones/b.webp': 'https://firmada/presentaciones/b.webp',
+        'pagos/c.pdf': 'https://firmada/pagos/c.pdf',
+    }
+
+
+def test_claves_con_error_quedan_en_none(supabase_falso):
+    urls = file_handlers.get_presigned_urls(['pagos/faltante.pdf', 'pagos/ok.pdf'])
+    assert urls == {'pagos/faltante.pdf': None, 'pagos/ok.pdf': 'https://firmada/pagos/ok.pdf'}
+
+
+def test_sin_claves_no_llama_a_supabase(supabase_falso):
+    assert file_handlers.get_presigned_urls([None, '']) == {}
+    assert supabase_falso.llamadas == []
+
+
+def test_listado_de_presentaciones_firma_la_pagina_en_una_llamada(client, auth_headers, datos, supabase_falso):
+    producto_id = datos['presentacion'].producto_id
+    datos['presentacion'].url_foto = 'presentaciones/1.webp'
+    db.session.add(m.PresentacionProducto(producto_id=producto_id, nombre='Saco 10kg', capacidad_kg=10,
+                                          tipo='procesado', precio_venta=35, url_foto='presentaciones/2.webp'))
+    db.session.commit()
+
+    respuesta = client.get('/presentaciones', headers=auth_headers)
+
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+    assert len(supabase_falso.llamadas) == 1
+    assert sorted(p['url_foto'] for p in respuesta.get_json()['data']) == [
+        'https://firmada/presentaciones/1.webp', 'https://firmada/presentaciones/2.webp'
+    ]
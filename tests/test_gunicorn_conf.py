@@ -0,0 +1,49 @@
+# tests/test_gunicorn_conf.py
+# gunicorn_conf.py aplica monkey.patch_all() al importarse: se prueba en un proceso aparte
+# para no parchear el proceso de pytest.
+import os
+import subprocess
+import sys
+import textwrap
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+ARRANQUE_WORKER = textwrap.dedent("""
+    import logging
+
+    import gunicorn_conf
+    from gevent import monkey
+
+    assert gunicorn_conf.worker_class == 'gevent'
+    assert gunicorn_conf.preload_app
+    assert monkey.is_module_patched('socket') and monkey.is_module_patched('ssl')
+
+    # Lo que hace gunicorn: importar la app en el master y luego ejecutar post_fork en el worker
+    from app import app
+
+    class Servidor:
+        log = logging.getLogger('gunicorn.error')
+
+    gunicorn_conf.on_starting(Servidor())
+    gunicorn_conf.post_fork(Servidor(), None)
+
+    import psycopg2.extensions
+    assert psycopg2.extensions.get_wait_callback() is not None
+
+    respuesta = app.test_client().get('/health')
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+""")
+
+
+def test_arranque_worker_gevent_con_preload():
+    env = {k: v for k, v in os.environ.items() if not k.startswith('GUNICORN_')}
+    env.update({
+        'DATABASE_URL': 'sqlite:///:memory:',
+        'JWT_SECRET_KEY': 'ci-testing-jwt-secret-key-32-chars-minimum',
+        'FLASK_ENV': 'testing',
+        'REDIS_URL': '',
+        'DB_MAX_CONNECTIONS': '1000',
+    })
+    resultado = subprocess.run([sys.executable, '-c', ARRANQUE_WORKER], cwd=RAIZ, env=env,
+                               capture_output=True, text=True, timeout=120)
+    assert resultado.returncode == 0, resultado.stderr
@@ -0,0 +1,87 @@
+# tests/test_models.py
+from datetime import UTC, datetime
+from decimal import Decimal
+
+import pytest
+
+import models as m
+from extensions import db
+
+
+def _venta(datos, total='100'):
+    venta = m.Venta(cliente_id=datos['cliente'].id, almacen_id=datos['almacen'].id,
+                    vendedor_id=datos['admin'].id, fecha=datetime.now(UTC),
+                    total=Decimal(total), tipo_pago='credito', estado_pago='pendiente')
+    db.session.add(venta)
+    db.session.flush()
+    return venta
+
+
+def _pagar(datos, venta, *montos):
+    for monto in montos:
+        db.session.add(m.Pago(venta_id=venta.id, usuario_id=datos['admin'].id, monto=Decimal(monto),
+                              metodo_pago='efectivo', fecha=datetime.now(UTC)))
+    db.session.flush()
+
+
+@pytest.mark.parametrize('montos, esperado', [
+    ((), 'pendiente'),
+    (('40',), 'parcial'),
+    (('60', '40'), 'pagado'),
+    (('33.33', '33.33', '33.34'), 'pagado'),
+    (('99.99',), 'parcial'),
+])
+def test_recalcular_estados_umbrales(datos, montos, esperado):
+    venta = _venta(datos)
+    _pagar(datos, venta, *montos)
+
+    m.Venta.recalcular_estados([venta.id])
+
+    assert db.session.get(m.Venta, venta.id).estado_pago == esperado
+
+
+def test_recalcular_estados_solo_ventas_indicadas(datos):
+    pagada, otra = _venta(datos), _venta(datos)
+    _pagar(datos, pagada, '100')
+    _pagar(datos, otra, '100')
+
+    m.Venta.recalcular_estados([pagada.id])
+
+    assert db.session.get(m.Venta, pagada.id).estado_pago == 'pagado'
+    assert db.session.get(m.Venta, otra.id).estado_pago == 'pendiente'
+
+
+def test_recalcular_estados_sin_ids(datos):
+    m.Venta.recalcular_estados([])
+    assert datos['venta'].estado_pago == 'pendiente'
+
+
+def test_saldo_cliente_refleja_pagos_nuevos(datos):
+    cliente = datos['cliente']
+    assert cliente.saldo_pendiente == Decimal('100')
+
+    _pagar(datos, datos['venta'], '40')
+
+    assert cliente.saldo_pendiente == Decimal('60')
+
+
+def test_saldo_cliente_asignado_en_lote(datos):
+    cliente = datos['cliente']
+    cliente.saldo_pendiente = Decimal('7')
+    assert cliente.saldo_pendiente == Decimal('7')
+
+
+def test_saldo_cliente_asignado_se_descarta_al_expirar(datos):
+    cliente = datos['cliente']
+    cliente.saldo_pendiente = Decimal('7')
+    db.session.expire(cliente)
+    assert cliente.saldo_pendiente == Decimal('100')
+
+    cliente.saldo_pendiente = Decimal('7')
+    db.session.refresh(cliente)
+    assert cliente.saldo_pendiente == Decimal('100')
+
+    cliente.saldo_pendiente = Decimal('7')
+    _pagar(datos, datos['venta'], '40')
+    db.session.commit()
+    assert cliente.saldo_pendiente == Decimal('60')
@@ -0,0 +1,59 @@
+# tests/test_proyecciones.py
+from datetime import date, timedelta
+
+import models as m
+from extensions import db
+
+HOY = date.today()
+
+
+def _crear_proyecciones():
+    """Cinco clientes: dos con la misma fecha, uno posterior y dos sin proyección."""
+    fechas = [HOY, HOY, HOY + timedelta(days=3), None, None]
+    ids = []
+    for i, fecha in enumerate(fechas):
+        cliente = m.Cliente(nombre=f'Cliente {i}', ciudad='Lima')
+        db.session.add(cliente)
+        db.session.flush()
+        cliente.proxima_compra_date = fecha
+        db.session.add(m.VistaClienteProyeccion(id=cliente.id, nombre=cliente.nombre, ciudad='Lima',
+                                                estado_proyeccion='pendiente' if fecha else None))
+        ids.append(cliente.id)
+    db.session.commit()
+    return ids
+
+
+def _codigos(respuesta):
+    return [int(c['codigo']) for c in respuesta['data']]
+
+
+def test_cursor_recorre_en_orden_de_fecha_con_nulos_al_final(client, auth_headers):
+    esperados = _crear_proyecciones()
+
+    respuesta = client.get('/clientes/proyecciones?per_page=2', headers=auth_headers).get_json()
+    vistos = _codigos(respuesta)
+    paginas = 1
+    cursor = respuesta['pagination']['next_cursor']
+    while cursor:
+        respuesta = client.get(f'/clientes/proyecciones?per_page=2&cursor={cursor}',
+                               headers=auth_headers).get_json()
+        vistos += _codigos(respuesta)
+        paginas += 1
+        cursor = respuesta['pagination']['next_cursor']
+
+    assert vistos == esperados
+    assert paginas == 3
+
+
+def test_filtro_por_fecha_usa_proxima_compra_date(client, auth_headers):
+    ids = _crear_proyecciones()
+    desde = (HOY + timedelta(days=1)).isoformat()
+
+    respuesta = client.get(f'/clientes/proyecciones?fecha_desde={desde}', headers=auth_headers).get_json()
+
+    assert _codigos(respuesta) == [ids[2]]
+
+
+def test_cursor_invalido(client, auth_headers):
+    _crear_proyecciones()
+    assert client.get('/clientes/proyecciones?cursor=zz', headers=auth_headers).status_code == 400
@@ -0,0 +1,45 @@
+# tests/test_serializers.py
+# Los serializadores escritos a mano del listado deben coincidir con los schemas de Marshmallow
+from datetime import UTC, date, datetime, timedelta
+from decimal import Decimal
+
+import models as m
+from extensions import db
+from resources.cliente_resource import ClienteResource, _dump_cliente_lista
+from resources.pedido_resource import _pedido_to_dict
+from schemas import clientes_schema, pedidos_schema
+
+
+def test_dump_cliente_lista_igual_a_cliente_schema(datos):
+    completo = datos['cliente']
+    completo.almacen_preferido_id = datos['almacen'].id
+    completo.ruc = '20123456789'
+    completo.direccion = 'Av. Principal 123'
+    completo.ultimo_contacto = datetime.now(UTC)
+    completo.proxima_compra_manual = date.today() + timedelta(days=5)
+    db.session.add(m.Cliente(nombre='Sin datos'))
+    db.session.add(m.Pago(venta_id=datos['venta'].id, usuario_id=datos['admin'].id, monto=Decimal('40'),
+                          metodo_pago='efectivo', fecha=datetime.now(UTC)))
+    db.session.commit()
+
+    pagina = ClienteResource._paginar_con_saldos(m.Cliente.query.order_by(m.Cliente.id), 1, 10)
+
+    assert len(pagina.items) == 2
+    assert [_dump_cliente_lista(c) for c in pagina.items] == clientes_schema.dump(pagina.items)
+
+
+def test_pedido_to_dict_igual_a_pedido_schema(datos):
+    con_detalle = m.Pedido(cliente_id=datos['cliente'].id, almacen_id=datos['almacen'].id,
+                           vendedor_id=datos['admin'].id, notas='Entregar temprano',
+                           fecha_entrega=datetime.now(UTC) + timedelta(days=1))
+    sin_detalle = m.Pedido(cliente_id=datos['cliente'].id, almacen_id=datos['almacen'].id,
+                           fecha_entrega=datetime.now(UTC))
+    db.session.add_all([con_detalle, sin_detalle])
+    db.session.flush()
+    db.session.add(m.PedidoDetalle(pedido_id=con_detalle.id, presentacion_id=datos['presentacion'].id,
+                                   cantidad=3, precio_estimado=Decimal('19.50')))
+    db.session.commit()
+
+    pedidos = m.Pedido.query.order_by(m.Pedido.id).all()
+
+    assert [_pedido_to_dict(p) for p in pedidos] == pedidos_schema.dump(pedidos)
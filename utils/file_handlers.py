@@ -14,9 +14,12 @@ logger = logging.getLogger(__name__)
 # Buckets válidos en Supabase
 VALID_BUCKETS = {'presentaciones', 'comprobantes', 'pagos'}
 
+# Extensiones por defecto si la app no define ALLOWED_EXTENSIONS
+DEFAULT_ALLOWED_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif', 'pdf'})
+
 def allowed_file(filename):
     """Verifica si la extensión del archivo es permitida"""
-    allowed_extensions = current_app.config.get('ALLOWED_EXTENSIONS', {'png', 'jpg', 'jpeg', 'gif', 'pdf'})
+    allowed_extensions = current_app.config.get('ALLOWED_EXTENSIONS', DEFAULT_ALLOWED_EXTENSIONS)
     if not filename:
         return False
     parts = filename.rsplit('.', 1)
@@ -218,6 +221,44 @@ def get_presigned_url(storage_key, expiration=3600):
         logger.error(f"Error inesperado generando URL pre-firmada para Supabase: {str(e)}")
         return None
 
+def get_presigned_urls(storage_keys, expiration=3600):
+    """
+    Genera URLs pre-firmadas para varias claves con una sola llamada a
+    Supabase por bucket (create_signed_urls) en lugar de una por clave.
+    Devuelve un dict {clave: url}; las claves que fallen quedan en None.
+    """
+    claves = {k for k in storage_keys if k}
+    urls = dict.fromkeys(claves)
+    if not claves:
+        return urls
+
+    if not supabase:
+        logger.error("Cliente de Supabase no configurado.")
+        return urls
+
+    # Agrupar rutas por bucket, recordando la clave original de cada ruta
+    por_bucket = {}
+    for clave in claves:
+        bucket_name, file_path = determine_bucket_and_path(clave)
+        if bucket_name and file_path:
+            por_bucket.setdefault(bucket_name, {})[file_path] = clave
+
+    for bucket_name, rutas in por_bucket.items():
+        try:
+            response = supabase.storage.from_(bucket_name).create_signed_urls(
+                list(rutas), expiration
+            )
+        except Exception as e:
+            logger.error(f"Error generando URLs pre-firmadas en bucket {bucket_name}: {str(e)}")
+            continue
+
+        for item in response:
+            clave = rutas.get(item.get('path'))
+            if clave and not item.get('error'):
+                urls[clave] = item.get('signedURL') or item.get('signedUrl')
+
+    return urls
+
 def delete_file(storage_key):
     """
     Elimina un archivo de Supabase Storage.